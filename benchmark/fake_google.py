@@ -0,0 +1,274 @@
+import hashlib
+import io
+import json
+import random
+import re
+import struct
+import threading
+import time
+import urllib.parse
+import uuid
+import zipfile
+import zlib
+from dataclasses import dataclass, field
+from email.parser import Parser
+import httplib2
+
+# Proporção padrão de cada tipo de entrega gerada para os alunos sintéticos
+DEFAULT_ARCHIVE_MIX = {
+    "zip": 0.45,
+    "zip_loose": 0.1,
+    "zip_wrong_folder": 0.1,
+    "zip_subfolders": 0.05,
+    "nested_zip": 0.05,
+    "rar": 0.1,
+    "raw_c": 0.05,
+    "malformed": 0.05,
+    "none": 0.05,
+}
+
+@dataclass
+class FakeClassroomData:
+    courses: list = field(default_factory=list)
+    course_work: dict = field(default_factory=dict)
+    submissions: dict = field(default_factory=dict)
+    students: dict = field(default_factory=dict)
+    files: dict = field(default_factory=dict)
+    archive_kinds: dict = field(default_factory=dict)
+
+    def add_file(self, name, content):
+        file_id = f"file-{len(self.files) + 1}"
+        self.files[file_id] = {
+            "id": file_id,
+            "name": name,
+            "content": content,
+            "md5Checksum": hashlib.md5(content).hexdigest(),
+            "modifiedTime": "2025-03-10T12:00:00.000Z",
+        }
+        return file_id
+
+def question_source(rng, question, login):
+    ops = ["+", "-", "*", "/", "%"]
+    body = " ".join(
+        f"int v{i} = {rng.randint(0, 9)} {rng.choice(ops)} {rng.randint(1, 9)};"
+        for i in range(rng.randint(5, 40))
+    )
+    return f"// questao {question} de {login}\n#include <stdio.h>\nint main() {{ {body} return 0; }}\n".encode()
+
+def build_zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members:
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+def _rar_block(head_type, flags, body, data=b""):
+    head = struct.pack("<BHH", head_type, flags, 7 + len(body)) + body
+    return struct.pack("<H", zlib.crc32(head) & 0xFFFF) + head + data
+
+# Gera um .rar (formato 4, sem compressão), que o rarfile lê sem precisar do unrar instalado
+def build_rar(members):
+    archive = b"Rar!\x1a\x07\x00" + _rar_block(0x73, 0, struct.pack("<HI", 0, 0))
+    for name, content in members:
+        encoded = name.encode()
+        body = struct.pack(
+            "<IIBIIBBHI", len(content), len(content), 3, zlib.crc32(content), 0x5A210000, 20, 0x30, len(encoded), 0o100644
+        ) + encoded
+        archive += _rar_block(0x74, 0x8000, body, content)
+    return archive + _rar_block(0x7B, 0x4000, b"")
+
+def build_attachment(rng, kind, login, questions):
+    files = [(f"q{q}_{login}.c", question_source(rng, q, login)) for q in range(1, questions + 1)]
+
+    if kind == "zip":
+        return f"{login}.zip", build_zip([(f"{login}/{name}", content) for name, content in files])
+    if kind == "zip_loose":
+        return f"{login}.zip", build_zip(files)
+    if kind == "zip_wrong_folder":
+        return f"Lista_{login}.zip", build_zip([(f"lista01/questao{i}.c", content) for i, (_, content) in enumerate(files, 1)])
+    if kind == "zip_subfolders":
+        return f"{login}.zip", build_zip([(f"{login}/src/{name}", content) for name, content in files] + [(f"{login}/output/main", b"\x7fELF")])
+    if kind == "nested_zip":
+        return f"{login}.zip", build_zip([(f"{login}.zip", build_zip([(f"{login}/{name}", content) for name, content in files]))])
+    if kind == "rar":
+        return f"{login}.rar", build_rar([(f"{login}/{name}", content) for name, content in files])
+    if kind == "raw_c":
+        name, content = files[0]
+        return name, content
+    if kind == "malformed":
+        return f"{login}.zip", b"PK\x03\x04" + bytes(rng.getrandbits(8) for _ in range(rng.randint(64, 2048)))
+    return None
+
+# Gera turmas sintéticas no formato das respostas do Classroom e do Drive
+def generate_dataset(semester="2025.1", num_classes=2, students_per_class=50, questions=4,
+                     list_title="LISTA 01 - Benchmark", archive_mix=None, seed=0):
+    rng = random.Random(seed)
+    archive_mix = archive_mix or DEFAULT_ARCHIVE_MIX
+    kinds = list(archive_mix)
+    weights = [archive_mix[kind] for kind in kinds]
+    data = FakeClassroomData()
+
+    for class_index in range(num_classes):
+        letter = chr(ord("A") + class_index)
+        course_id = f"course-{letter}"
+        coursework_id = f"cw-{letter}"
+        data.courses.append({"id": course_id, "name": f"PIF {semester} TURMA {letter}"})
+        data.course_work[course_id] = [{
+            "id": coursework_id,
+            "title": list_title,
+            "dueDate": {"year": 2025, "month": 3, "day": 10},
+            "dueTime": {"hours": 2, "minutes": 59, "seconds": 59},
+        }]
+        data.students[course_id] = []
+        data.submissions[(course_id, coursework_id)] = []
+
+        for student_index in range(students_per_class):
+            user_id = f"user-{letter}-{student_index}"
+            login = f"al{letter.lower()}{student_index:04d}"
+            data.students[course_id].append({
+                "userId": user_id,
+                "profile": {"emailAddress": f"{login}@cesar.school", "name": {"fullName": f"Aluno {letter} {student_index}"}},
+            })
+
+            kind = rng.choices(kinds, weights)[0]
+            data.archive_kinds[login] = kind
+            attachment = build_attachment(rng, kind, login, questions)
+
+            submission = {
+                "userId": user_id,
+                "state": "TURNED_IN" if attachment else "CREATED",
+                "submissionHistory": [{"stateHistory": {
+                    "state": "TURNED_IN", "actorUserId": user_id,
+                    "stateTimestamp": f"2025-03-{rng.randint(8, 12):02d}T10:00:00.000Z",
+                }}],
+                "assignmentSubmission": {},
+            }
+            if attachment:
+                name, content = attachment
+                file_id = data.add_file(name, content)
+                submission["assignmentSubmission"]["attachments"] = [{"driveFile": {"id": file_id, "title": name}}]
+            data.submissions[(course_id, coursework_id)].append(submission)
+
+    return data
+
+class FakeGoogleHttp:
+    # Substituto do httplib2.Http para build("classroom", "v1", http=...) e build("drive", "v3", http=...).
+    # Atende os endpoints usados pelo pipeline, inclusive lotes e download de mídia por faixa de bytes.
+    # latency simula o tempo de ida e volta de cada requisição HTTP.
+    def __init__(self, data, latency=0.0):
+        self.data = data
+        self.latency = latency
+        self.requests = 0
+        self.media_bytes = 0
+        self._lock = threading.Lock()
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        parsed = urllib.parse.urlparse(uri)
+        if method == "POST" and "batch" in parsed.path:
+            return self._batch(body, headers or {})
+
+        status, payload, extra_headers = self._route(method, parsed.path, urllib.parse.parse_qs(parsed.query), headers or {})
+        if isinstance(payload, bytes):
+            response_headers = {"status": str(status)}
+        else:
+            payload = json.dumps(payload).encode()
+            response_headers = {"status": str(status), "content-type": "application/json"}
+        response_headers.update(extra_headers)
+        return httplib2.Response(response_headers), payload
+
+    def _route(self, method, path, query, headers):
+        routes = [
+            (r"/v1/courses", self._list_courses),
+            (r"/v1/courses/([^/]+)/courseWork", self._list_course_work),
+            (r"/v1/courses/([^/]+)/courseWork/([^/]+)", self._get_course_work),
+            (r"/v1/courses/([^/]+)/courseWork/([^/]+)/studentSubmissions", self._list_submissions),
+            (r"/v1/courses/([^/]+)/students", self._list_students),
+            (r"/v1/courses/([^/]+)/students/([^/]+)", self._get_student),
+            (r"/drive/v3/files/([^/]+)", self._get_file),
+        ]
+        for pattern, handler in routes:
+            match = re.fullmatch(pattern, path)
+            if match and method == "GET":
+                return handler(query, headers, *(urllib.parse.unquote(group) for group in match.groups()))
+        return self._error(404, f"Rota não suportada pelo Classroom falso: {method} {path}")
+
+    def _error(self, status, message):
+        return status, {"error": {"code": status, "message": message}}, {}
+
+    def _page(self, items, key, query):
+        page_size = int(query.get("pageSize", ["100"])[0])
+        start = int(query.get("pageToken", ["0"])[0])
+        response = {key: items[start:start + page_size]}
+        if start + page_size < len(items):
+            response["nextPageToken"] = str(start + page_size)
+        return 200, response, {}
+
+    def _list_courses(self, query, headers):
+        return self._page(self.data.courses, "courses", query)
+
+    def _list_course_work(self, query, headers, course_id):
+        return self._page(self.data.course_work.get(course_id, []), "courseWork", query)
+
+    def _get_course_work(self, query, headers, course_id, coursework_id):
+        for coursework in self.data.course_work.get(course_id, []):
+            if coursework["id"] == coursework_id:
+                return 200, coursework, {}
+        return self._error(404, "courseWork não encontrado")
+
+    def _list_submissions(self, query, headers, course_id, coursework_id):
+        return self._page(self.data.submissions.get((course_id, coursework_id), []), "studentSubmissions", query)
+
+    def _list_students(self, query, headers, course_id):
+        return self._page(self.data.students.get(course_id, []), "students", query)
+
+    def _get_student(self, query, headers, course_id, user_id):
+        for student in self.data.students.get(course_id, []):
+            if student["userId"] == user_id:
+                return 200, student, {}
+        return self._error(404, "aluno não encontrado")
+
+    def _get_file(self, query, headers, file_id):
+        drive_file = self.data.files.get(file_id)
+        if drive_file is None:
+            return self._error(404, "arquivo não encontrado")
+
+        if query.get("alt") != ["media"]:
+            return 200, {k: v for k, v in drive_file.items() if k != "content"}, {}
+
+        content = drive_file["content"]
+        total = len(content)
+        if total == 0:
+            return 416, b"", {"content-range": "bytes */0"}
+
+        start, end = 0, total - 1
+        match = re.match(r"bytes=(\d+)-(\d+)", headers.get("range", ""))
+        if match:
+            start, end = int(match.group(1)), min(int(match.group(2)), total - 1)
+        chunk = content[start:end + 1]
+        with self._lock:
+            self.media_bytes += len(chunk)
+        return 206, chunk, {"content-range": f"bytes {start}-{end}/{total}"}
+
+    def _batch(self, body, headers):
+        message = Parser().parsestr(f"content-type: {headers['content-type']}\r\n\r\n{body}")
+        boundary = uuid.uuid4().hex
+        parts = []
+
+        for part in message.get_payload():
+            request_line, _, rest = part.get_payload().partition("\n")
+            method, target, _ = request_line.split(" ", 2)
+            parsed = urllib.parse.urlparse(target)
+            status, payload, _ = self._route(method, parsed.path, urllib.parse.parse_qs(parsed.query), {})
+            content_id = part["Content-ID"].replace("<", "<response-", 1)
+            parts.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n\r\n{json.dumps(payload)}\r\n"
+            )
+
+        content = "".join(parts) + f"--{boundary}--\r\n"
+        return httplib2.Response({"status": "200", "content-type": f"multipart/mixed; boundary={boundary}"}), content.encode()
@@ -0,0 +1,91 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from benchmark.fake_google import FakeGoogleHttp, generate_dataset
+from download_main import ClassJob, build_services, create_extraction_pool, process_class
+from infrastructure.blob_store import BlobStore
+from infrastructure.classroom_gateway import get_due_dates
+from services.question_matcher import QuestionMatcher
+from utils.log_writer import close_writer, set_log_folder
+from utils.metrics import write_metrics
+
+LIST_TITLE = "LISTA 01 - Benchmark"
+
+def benchmark_questions(num_questions):
+    return {
+        i: [f'{i}', f'q{i}', f'Q{i}', f'questao{i}', f'questão{i}']
+        for i in range(1, num_questions + 1)
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark do pipeline download -> organização -> renomeação com um Classroom/Drive falso.")
+    parser.add_argument("--classes", type=int, default=2, help="quantidade de turmas")
+    parser.add_argument("--students", type=int, default=100, help="alunos por turma")
+    parser.add_argument("--questions", type=int, default=4, help="questões por lista")
+    parser.add_argument("--latency", type=float, default=0.02, help="latência simulada por requisição HTTP, em segundos")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="mantém a pasta de saída do benchmark, com os logs e as métricas")
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    data = generate_dataset(
+        num_classes=args.classes, students_per_class=args.students, questions=args.questions,
+        list_title=LIST_TITLE, seed=args.seed
+    )
+    http = FakeGoogleHttp(data, latency=args.latency)
+    classroom_service, _ = build_services(http=http)
+
+    work_dir = tempfile.mkdtemp(prefix="benchmark_")
+    # Logs e métricas do benchmark ficam na pasta de trabalho, sem misturar com os da execução real em output/
+    output_folder = os.path.join(work_dir, "output")
+    set_log_folder(output_folder)
+    base_path = os.path.join(work_dir, "Downloads", "LISTA 01")
+    jobs = [
+        ClassJob(course["name"].split()[-1], course["id"], data.course_work[course["id"]][0]["id"], course["name"], base_path)
+        for course in data.courses
+    ]
+    question_matcher = QuestionMatcher(benchmark_questions(args.questions))
+
+    start = time.perf_counter()
+    due_dates = get_due_dates(classroom_service, [(job.classroom_id, job.coursework_id) for job in jobs])
+    for job in jobs:
+        job.due_date = due_dates.get((job.classroom_id, job.coursework_id))
+        os.makedirs(job.zips_folder, exist_ok=True)
+
+    blob_store = BlobStore(os.path.join(work_dir, "Downloads", ".blobs"))
+    with create_extraction_pool() as extraction_pool, ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        futures = [
+            executor.submit(process_class, job, LIST_TITLE, question_matcher, blob_store, http=http, extraction_pool=extraction_pool)
+            for job in jobs
+        ]
+        for future in futures:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    students = args.classes * args.students
+    report = {
+        "classes": args.classes,
+        "students": students,
+        "seconds": round(elapsed, 3),
+        "students_per_second": round(students / elapsed, 2),
+        "bytes_downloaded": http.media_bytes,
+        "bytes_per_second": round(http.media_bytes / elapsed, 2),
+        "http_requests": http.requests,
+    }
+    print(json.dumps(report, indent=4))
+    write_metrics("benchmark", output_folder)
+
+    if args.keep:
+        print("Saída do benchmark mantida em:", work_dir)
+    else:
+        # Os logs que ainda estão na fila são gravados antes de a pasta ser apagada
+        close_writer()
+        shutil.rmtree(work_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+from dataclasses import dataclass, field, asdict
+import json
+import os
+import threading
+from utils.utils import log_error, log_info
+
+STAGE_DOWNLOADED = "downloaded"
+STAGE_ORGANIZED = "organized"
+STAGE_RENAMED = "renamed"
+
+@dataclass
+class AttachmentRecord:
+    file_id: str
+    title: str
+    modified_time: str = ''
+    md5_checksum: str = ''
+    path: str = ''
+
+    def fingerprint(self):
+        return (self.file_id, self.md5_checksum or self.modified_time)
+
+# O estado do aluno (campos e comentários) fica só no arquivo de alunos e no diário da turma; o manifesto guarda
+# apenas a etapa e os anexos baixados
+@dataclass
+class ManifestEntry:
+    login: str
+    user_id: str
+    stage: str
+    attachments: list = field(default_factory=list)
+
+@dataclass
+class DownloadManifest:
+    class_name: str
+    list_name: str
+    entries: dict = field(default_factory=dict)
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+        self._path = None
+
+    def stage_of(self, login):
+        entry = self.entries.get(login)
+        return entry.stage if entry else None
+
+    def can_reuse(self, login, attachments, download_folder):
+        # Só reaproveita o aluno se os anexos no Drive não mudaram e o que já foi feito ainda está no disco
+        entry = self.entries.get(login)
+        if entry is None:
+            return False
+
+        if [a.fingerprint() for a in entry.attachments] != [a.fingerprint() for a in attachments]:
+            return False
+
+        # Anexo sem caminho é um download que falhou: é baixado de novo, seja qual for a etapa em que o aluno parou
+        if any(not attachment.path for attachment in entry.attachments):
+            return False
+
+        if entry.stage == STAGE_DOWNLOADED:
+            for attachment in entry.attachments:
+                if not os.path.exists(os.path.join(download_folder, attachment.path)):
+                    return False
+        return True
+
+    def discard_downloads(self, login, download_folder):
+        entry = self.entries.get(login)
+        if entry is None:
+            return
+
+        for attachment in entry.attachments:
+            if not attachment.path:
+                continue
+            path = os.path.join(download_folder, attachment.path)
+            if os.path.isfile(path):
+                os.remove(path)
+                log_info(f"Removido anexo antigo de {login}: {path}")
+
+    # Só atualiza a memória: o manifesto é gravado junto com o arquivo de alunos (compact_students), e não a cada aluno
+    def record_download(self, login, user_id, attachments, download_folder):
+        for attachment in attachments:
+            if attachment.path:
+                attachment.path = os.path.relpath(attachment.path, download_folder)
+
+        with self._lock:
+            self.entries[login] = ManifestEntry(
+                login=login,
+                user_id=user_id,
+                stage=STAGE_DOWNLOADED,
+                attachments=attachments
+            )
+
+    # Com journal, cada transição vira uma linha do diário da turma em vez de o manifesto ser regravado; o diário é
+    # reaplicado no manifesto ao carregar (load_registry_from_txt) até a próxima compactação
+    def set_stage(self, students, stage, journal=None):
+        with self._lock:
+            for student in students:
+                entry = self.entries.get(student.login)
+                if entry is not None:
+                    entry.stage = stage
+                    if journal is not None:
+                        journal.record_stage(student.login, stage)
+
+    def restore_stage(self, login, stage):
+        with self._lock:
+            entry = self.entries.get(login)
+            if entry is not None:
+                entry.stage = stage
+
+    def save(self, path=None):
+        with self._lock:
+            if path:
+                self._path = path
+            if self._path:
+                return save_manifest_to_json(self, self._path)
+            return False
+
+def save_manifest_to_json(manifest: DownloadManifest, path: str):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(asdict(manifest), f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        log_error(f"Erro ao salvar manifesto em {path}: {e}")
+        return False
+
+def load_manifest_from_json(path: str, class_name: str, list_name: str) -> DownloadManifest:
+    manifest = DownloadManifest(class_name=class_name, list_name=list_name)
+    try:
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+
+            for login, entry in data.get("entries", {}).items():
+                # Manifestos antigos guardavam também uma cópia do aluno
+                entry.pop("student", None)
+                entry["attachments"] = [AttachmentRecord(**a) for a in entry.get("attachments", [])]
+                manifest.entries[login] = ManifestEntry(**entry)
+            log_info(f"Manifesto carregado de {path}: {len(manifest.entries)} alunos registrados")
+    except Exception as e:
+        log_error(f"Erro ao carregar manifesto de {path}: {e}")
+
+    manifest._path = path
+    return manifest
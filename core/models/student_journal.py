@@ -0,0 +1,104 @@
+import json
+import os
+import threading
+from utils.utils import log_error, log_info
+
+# Diário de alterações de um students_turmaX.json: cada update_field e add_comment feito num aluno com o diário
+# anexado e cada mudança de etapa no manifesto da turma vira uma linha JSON acrescentada ao arquivo, em vez de o
+# arquivo de alunos e o manifesto inteiros serem regravados a cada etapa. Ao carregar, o arquivo de alunos (snapshot)
+# é lido e o diário é reaplicado por cima; a compactação (compact_students em student_registry.py) grava um novo
+# snapshot e o manifesto e esvazia o diário.
+
+def journal_path(students_path):
+    return f"{os.path.splitext(students_path)[0]}.journal"
+
+# Corta uma última linha incompleta (queda no meio de uma escrita), para a próxima alteração não ser grudada nela
+def drop_torn_tail(path):
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as file:
+        content = file.read()
+        if content and not content.endswith(b'\n'):
+            file.truncate(content.rfind(b'\n') + 1)
+            log_info(f"Linha incompleta no fim do diário {path} descartada.")
+
+class StudentJournal:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        drop_torn_tail(path)
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            # Uma linha por escrita: se o processo cair, no máximo a última linha fica incompleta
+            self._file.write(line)
+            self._file.flush()
+
+    def record_field(self, login, field, value):
+        self.append({"op": "field", "login": login, "field": field, "value": value})
+
+    def record_comment(self, login, text):
+        self.append({"op": "comment", "login": login, "text": text})
+
+    def record_stage(self, login, stage):
+        self.append({"op": "stage", "login": login, "stage": stage})
+
+    # Garante no disco o que foi escrito até aqui; chamado ao fim de cada etapa
+    def sync(self):
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def truncate(self):
+        with self._lock:
+            self._file.truncate(0)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+# Reaplica o diário nos alunos (indexados por login) e, com manifest, as etapas no manifesto da turma. Reaplicar duas
+# vezes dá o mesmo resultado: campos e etapas são sobrescritos e os comentários repetidos são ignorados pelo add_comment.
+def replay_journal(students, path, manifest=None):
+    if not os.path.exists(path):
+        return 0
+
+    replayed = 0
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    log_info(f"Linha incompleta no diário {path} ignorada.")
+                    continue
+
+                if entry.get("op") == "stage":
+                    if manifest is not None:
+                        manifest.restore_stage(entry["login"], entry["stage"])
+                        replayed += 1
+                    continue
+
+                student = students.get(entry.get("login"))
+                if student is None:
+                    continue
+                if entry.get("op") == "field":
+                    student.update_field(entry["field"], entry["value"])
+                elif entry.get("op") == "comment":
+                    student.add_comment(entry["text"])
+                replayed += 1
+        if replayed:
+            log_info(f"{replayed} alterações do diário {path} reaplicadas")
+    except Exception as e:
+        log_error(f"Erro ao reaplicar o diário {path}: {e}")
+    return replayed
@@ -0,0 +1,81 @@
+import os
+from core.models.student_submission import load_students_from_txt, save_students_to_txt
+from core.models.student_journal import journal_path, replay_journal
+from utils.utils import log_info
+
+class StudentRegistry:
+    # Alunos de uma turma na ordem em que foram inseridos (a ordem usada ao salvar e ao preencher a planilha),
+    # indexados por login, email e userId do Classroom. Todas as etapas compartilham os mesmos objetos, então uma
+    # alteração feita num aluno achado pelo índice vale para a lista toda.
+    def __init__(self, students=()):
+        self._students = []
+        self._by_login = {}
+        self._by_email = {}
+        self._by_user_id = {}
+        self._journal = None
+        for student in students:
+            self.add(student)
+
+    def add(self, student):
+        if student.login in self._by_login:
+            log_info(f"Login {student.login} repetido na turma: o índice continua apontando para o primeiro aluno.")
+        else:
+            self._by_login[student.login] = student
+        if student.email:
+            self._by_email.setdefault(student.email.lower(), student)
+        if student.user_id:
+            self._by_user_id.setdefault(student.user_id, student)
+        self._students.append(student)
+        if self._journal is not None:
+            student.attach_journal(self._journal)
+
+    # A partir daqui as alterações dos alunos (inclusive dos subconjuntos criados por filter) vão para o diário
+    def attach_journal(self, journal):
+        self._journal = journal
+        for student in self._students:
+            student.attach_journal(journal)
+
+    def get(self, login, default=None):
+        return self._by_login.get(login, default)
+
+    def by_email(self, email):
+        return self._by_email.get(email.lower()) if email else None
+
+    def by_user_id(self, user_id):
+        return self._by_user_id.get(user_id)
+
+    # Subconjunto com os mesmos objetos de aluno, na mesma ordem
+    def filter(self, predicate):
+        return StudentRegistry(student for student in self._students if predicate(student))
+
+    def logins(self):
+        return list(self._by_login)
+
+    def __contains__(self, login):
+        return login in self._by_login
+
+    def __iter__(self):
+        return iter(self._students)
+
+    def __len__(self):
+        return len(self._students)
+
+# Alunos do snapshot students_turmaX.json com as alterações do diário reaplicadas; com manifest, as mudanças de
+# etapa do diário também são reaplicadas no manifesto da turma
+def load_registry_from_txt(path, manifest=None):
+    registry = StudentRegistry(load_students_from_txt(path))
+    replay_journal(registry, journal_path(path), manifest)
+    return registry
+
+# Grava o estado atual como novo snapshot e esvazia o diário. journal é o diário aberto desses alunos, se houver
+# (o arquivo não pode ser apagado enquanto está aberto para escrita). Com manifest, ele é gravado antes, já que as
+# etapas registradas no diário só ficam nele.
+def compact_students(registry, path, journal=None, manifest=None):
+    if manifest is not None and not manifest.save():
+        return
+    if not save_students_to_txt(registry, path):
+        return
+    if journal is not None:
+        journal.truncate()
+    elif os.path.exists(journal_path(path)):
+        os.remove(journal_path(path))
@@ -1,18 +1,84 @@
-from dataclasses import dataclass, asdict
 import json
+import os
 from utils.utils import log_error, log_info
 
-@dataclass
+# Campos que podem ser alterados por update_field e o tipo de cada um
+FIELD_TYPES = {
+    'name': str,
+    'email': str,
+    'login': str,
+    'entregou': int,
+    'atrasou': int,
+    'formatacao': int,
+    'copia': int,
+    'nota_total': str,
+    'comentario': str,
+    'user_id': str,
+}
+
 class StudentSubmission:
-    name: str
-    email: str
-    login: str
-    entregou: int
-    atrasou: int
-    formatacao: int
-    copia: int
-    nota_total: str = ''
-    comentario: str = ''
+    # Os comentários ficam num dict usado como conjunto ordenado e só são juntados em comentario quando lidos.
+    # O comentario carregado de um arquivo salvo vira o primeiro item, e um comentário novo que já aparece nele
+    # não é repetido (como acontecia com o texto concatenado).
+    # Com um StudentJournal anexado, cada alteração também é registrada nele.
+    __slots__ = ('name', 'email', 'login', 'entregou', 'atrasou', 'formatacao', 'copia', 'nota_total', 'user_id',
+                 '_comments', '_saved_comment', '_comment_text', '_journal')
+
+    def __init__(self, name, email, login, entregou, atrasou, formatacao, copia, nota_total='', comentario='', user_id=''):
+        self.name = name
+        self.email = email
+        self.login = login
+        self.entregou = entregou
+        self.atrasou = atrasou
+        self.formatacao = formatacao
+        self.copia = copia
+        self.nota_total = nota_total
+        self.user_id = user_id
+        self.comentario = comentario
+        self._journal = None
+
+    @property
+    def comentario(self):
+        if self._comment_text is None:
+            self._comment_text = " ".join(self._comments)
+        return self._comment_text
+
+    @comentario.setter
+    def comentario(self, text):
+        self._comments = {text: None} if text else {}
+        self._saved_comment = text
+        self._comment_text = text
+
+    def __repr__(self):
+        return f"StudentSubmission({', '.join(f'{field}={value!r}' for field, value in self.to_dict().items())})"
+
+    def __eq__(self, other):
+        if not isinstance(other, StudentSubmission):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def attach_journal(self, journal):
+        self._journal = journal
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'email': self.email,
+            'login': self.login,
+            'entregou': self.entregou,
+            'atrasou': self.atrasou,
+            'formatacao': self.formatacao,
+            'copia': self.copia,
+            'nota_total': self.nota_total,
+            'comentario': self.comentario,
+            'user_id': self.user_id,
+        }
 
     def to_list(self, num_questions: int):
         try:
@@ -22,35 +88,45 @@ class StudentSubmission:
         except Exception as e:
             log_error(f"Erro ao converter student {self.login} para lista: {e}")
             return []
-    
+
     def add_comment(self, text):
-        try:
-            if text and text not in self.comentario:
-                if self.comentario:
-                    self.comentario += f" {text}"
-                else:
-                    self.comentario = text
-        except Exception as e:
-            log_error(f"Erro ao adicionar comentário para {self.login}: {e}")
-    
+        if not text or text in self._comments or (self._saved_comment and text in self._saved_comment):
+            return
+        self._comments[text] = None
+        self._comment_text = None
+        if self._journal is not None:
+            self._journal.record_comment(self.login, text)
+
     def update_field(self, field, value):
-        try:
-            if hasattr(self, field):
-                setattr(self, field, value)
-            else:
-                log_error(f"Campo '{field}' não encontrado para o aluno {self.login}")
-        except Exception as e:
-            log_error(f"Erro ao atualizar campo '{field}' para {self.login}: {e}")
+        field_type = FIELD_TYPES.get(field)
+        if field_type is None:
+            log_error(f"Campo '{field}' não encontrado para o aluno {self.login}")
+            return
+        if not isinstance(value, field_type):
+            log_error(f"Valor inválido para o campo '{field}' do aluno {self.login}: {value!r}")
+            return
+        if getattr(self, field) == value:
+            return
+        setattr(self, field, value)
+        if self._journal is not None:
+            self._journal.record_field(self.login, field, value)
 
+# O arquivo é gravado ao lado e renomeado por cima do anterior, então uma queda no meio não deixa o arquivo pela metade
 def save_students_to_txt(student_list, path):
     try:
-        with open(path, 'w', encoding='utf-8') as file:
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
             for student in student_list:
-                json.dump(asdict(student), file, ensure_ascii=False)
+                json.dump(student.to_dict(), file, ensure_ascii=False)
                 file.write('\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
         log_info(f"Lista de alunos salva com sucesso em {path}")
+        return True
     except Exception as e:
         log_error(f"Erro ao salvar alunos em {path}: {e}")
+        return False
 
 def load_students_from_txt(path):
     students = []
@@ -1,24 +1,150 @@
+import argparse
 import os
 import re
 import shutil
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseDownload
-from core.models.student_submission import StudentSubmission, save_students_to_txt, load_students_from_txt
+from core.models.student_submission import StudentSubmission
+from core.models.student_registry import StudentRegistry, load_registry_from_txt, compact_students
+from core.models.student_journal import StudentJournal, journal_path
 from services.file_renamer import rename_files, integrate_renaming
+from services.question_matcher import QuestionMatcher
+from services.copy_detector import detect_copies
 from infrastructure.submission_handler import download_submissions
+from infrastructure.blob_store import BlobStore
 from utils.utils import log_error, format_list_title, read_id_from_file, log_info
+from utils.log_writer import log_context
+from utils.metrics import write_metrics
+from utils.profiling import enable_profiling, profiling_enabled, profile_stage
 from infrastructure.auth_google import get_credentials, get_gspread_client
-from infrastructure.classroom_gateway import list_classroom_data
+from infrastructure.classroom_gateway import list_classroom_data, list_class_letters, iter_student_submissions, get_due_dates
 from utils.sheet_id_handler import  list_informations, list_questions
 from core.models.list_metadata import ListMetadata, save_metadata_to_json, load_metadata_from_json
-from infrastructure.folders_organizer import (organize_extracted_files, move_non_zip_files, if_there_is_a_folder_inside, delete_subfolders_in_student_folders, remove_empty_folders)
+from core.models.download_manifest import load_manifest_from_json, STAGE_DOWNLOADED, STAGE_ORGANIZED, STAGE_RENAMED
+from infrastructure.folders_organizer import organize_extracted_files, move_non_zip_files
 
-def main():
+# Quantidade de anexos baixados em paralelo por turma
+DOWNLOAD_WORKERS = 8
+SUBMISSIONS_PAGE_SIZE = 50
+# Processos usados para extrair e organizar os arquivos dos alunos
+EXTRACTION_WORKERS = os.cpu_count()
+# Arquivo opcional com as turmas a processar (ex: "A, B, C"); sem ele as turmas são descobertas no Classroom
+CLASSES_FILE = os.path.join("input", "classes.txt")
+
+@dataclass
+class ClassJob:
+    class_letter: str
+    classroom_id: str
+    coursework_id: str
+    classroom_name: str
+    base_path: str
+    due_date: str = None
+
+    @property
+    def formatted_class(self):
+        return f"turma{self.class_letter}"
+
+    @property
+    def zips_folder(self):
+        return os.path.join(self.base_path, f"zips_{self.formatted_class}")
+
+    @property
+    def students_path(self):
+        return os.path.join(self.base_path, f"students_turma{self.class_letter.upper()}.json")
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.base_path, f"manifest_turma{self.class_letter.upper()}.json")
+
+def create_extraction_pool():
+    # Com --profile a extração roda na thread da turma, para entrar no cProfile da etapa
+    if profiling_enabled():
+        return nullcontext()
+    # spawn evita fazer fork de um processo que já tem as threads das turmas e dos downloads rodando
+    return ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+def get_class_letters(classroom_service, semester):
+    configured = read_id_from_file(CLASSES_FILE)
+    if configured:
+        return [letter.upper() for letter in re.split(r"[,\s]+", configured) if letter]
+    return list_class_letters(classroom_service, semester)
+
+# http permite trocar o transporte das APIs (ex: o Classroom/Drive falso do benchmark) no lugar das credenciais
+def build_services(creds=None, http=None):
+    kwargs = {"http": http} if http is not None else {"credentials": creds}
+    return build("classroom", "v1", **kwargs), build("drive", "v3", **kwargs)
+
+def process_class(job, list_title, question_matcher, blob_store, creds=None, http=None, extraction_pool=None):
+    # Cada turma roda em sua própria thread, então cria seus próprios clientes da API
+    classroom_service, drive_service = build_services(creds, http)
+
+    class_letter = job.class_letter
+    formatted_class = job.formatted_class
+    zips_folder = job.zips_folder
+    submissions_folder = os.path.join(zips_folder, f"submissions_{formatted_class}")
+    final_submissions_folder = os.path.join(job.base_path, "submissions")
+
+    manifest = load_manifest_from_json(job.manifest_path, job.classroom_name, list_title)
+    students_path = job.students_path
+    # Estado da execução anterior: o snapshot com o diário reaplicado, inclusive as etapas, que voltam para o manifesto.
+    # Os alunos cujos anexos não mudaram são reaproveitados daqui.
+    previous_students = StudentRegistry()
+    if os.path.exists(students_path):
+        previous_students = load_registry_from_txt(students_path, manifest)
+
+    submissions = iter_student_submissions(classroom_service, job.classroom_id, job.coursework_id, SUBMISSIONS_PAGE_SIZE)
+
+    print(f"\nComeçando download da turma {class_letter} ...")
+    with log_context(stage="download"), profile_stage(f"download_{formatted_class}"):
+        student_list = download_submissions(
+            classroom_service, drive_service, submissions, zips_folder, job.classroom_id, job.coursework_id,
+            max_workers=0 if profiling_enabled() else DOWNLOAD_WORKERS, creds=creds, manifest=manifest, due_date=job.due_date,
+            blob_store=blob_store, previous_students=previous_students
+        )
+    print(f"\nDownload da turma {class_letter} completo. Arquivos salvos em:", os.path.abspath(zips_folder))
+
+    # O arquivo de alunos e o manifesto são gravados inteiros uma vez, com a lista recém-baixada (o diário anterior já
+    # foi reaplicado nela); as alterações e as mudanças de etapa seguintes vão para o diário da turma
+    with StudentJournal(journal_path(students_path)) as journal:
+        compact_students(student_list, students_path, journal, manifest)
+        student_list.attach_journal(journal)
+
+        to_organize = student_list.filter(lambda s: manifest.stage_of(s.login) == STAGE_DOWNLOADED)
+        for student in to_organize:
+            for folder in (os.path.join(submissions_folder, student.login), os.path.join(final_submissions_folder, student.login)):
+                if os.path.isdir(folder):
+                    shutil.rmtree(folder)
+
+        with log_context(stage="organize"), profile_stage(f"organize_{formatted_class}"):
+            organize_extracted_files(zips_folder, to_organize, formatted_class, extraction_pool)
+            move_non_zip_files(zips_folder, formatted_class)
+        manifest.set_stage(to_organize, STAGE_ORGANIZED, journal)
+        journal.sync()
+
+        print(f"\nProcesso de organização de pastas da turma {class_letter} finalizado:", os.path.abspath(submissions_folder))
+
+        to_rename = student_list.filter(lambda s: manifest.stage_of(s.login) == STAGE_ORGANIZED)
+        with log_context(stage="rename"), profile_stage(f"rename_{formatted_class}"):
+            rename_files(submissions_folder, list_title, question_matcher, to_rename)
+        manifest.set_stage(to_rename, STAGE_RENAMED, journal)
+        journal.sync()
+        student_list.attach_journal(None)
+    print(f"\nProcesso de verificação e renomeação da turma {class_letter} finalizado.")
+
+    return zips_folder
+
+def main(profile=False):
     try:
+        if profile:
+            enable_profiling("download")
+
         creds = get_credentials()
         classroom_service = build("classroom", "v1", credentials=creds)
-        drive_service = build("drive", "v3", credentials=creds)
 
         sheet_id = read_id_from_file(os.path.join("input", "sheet_id.txt"))
         if not sheet_id:
@@ -27,102 +153,101 @@ def main():
 
         semester, lists = list_informations(sheet_id)
 
-        list_name = list_title = None
-        list_title_a = None
-        turma_folders = []
+        class_letters = get_class_letters(classroom_service, semester)
+        if not class_letters:
+            print(f"Nenhuma turma encontrada para o semestre {semester}.\n")
+            return
 
-        formatted_list = None
+        list_name_ref = list_title_ref = None
+        formatted_list = base_path = None
         script_dir = os.path.dirname(os.path.abspath(__file__))
+        jobs = []
 
-        for class_letter in ["A", "B"]:
+        # A seleção da lista é interativa na primeira turma, então os dados das turmas são buscados em sequência
+        for class_letter in class_letters:
             turma_type = f"TURMA {class_letter}"
 
             classroom_id, coursework_id, classroom_name, list_name, list_title = list_classroom_data(
-                classroom_service, semester, turma_type=turma_type, saved_assignment_title=list_title_a
+                classroom_service, semester, turma_type=turma_type, saved_assignment_title=list_title_ref
             )
 
             if not classroom_id:
                 print("Dados da turma não encontrados.\n")
                 return
 
-            if class_letter == "A":
-                list_title_a = list_title
+            if list_title_ref is None:
+                list_title_ref = list_title
                 list_name_ref = list_name
                 formatted_list = format_list_title(list_name)
                 base_path = os.path.join(script_dir, "Downloads", formatted_list)
                 if os.path.exists(base_path):
-                    print(f"Já existe uma pasta de download para a lista '{formatted_list}', não é possível continuar.\n")
-                    return
-            else:
-                if list_name != list_name_ref:
-                    print("As duas turmas devem usar a mesma atividade.\n")
-                    return
-
-            try:
-                questions_data, num_questions, score = list_questions(sheet_id, list_name)
-                if not score or not questions_data:
-                    print("\nA aba da planilha precisa conter número de questões e score.")
-                    return
-            except Exception as e:
-                print(f"Erro ao carregar dados da planilha: {e}")
+                    print(f"Já existe uma pasta de download para a lista '{formatted_list}', retomando a partir do manifesto.\n")
+            elif list_name != list_name_ref:
+                print("Todas as turmas devem usar a mesma atividade.\n")
                 return
 
-            formatted_class = f"turma{class_letter}"
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            base_path = os.path.join(script_dir, "Downloads", formatted_list)
-            zips_folder = os.path.join(base_path, f"zips_{formatted_class}")
-            submissions_folder = os.path.join(zips_folder, f"submissions_{formatted_class}")
+            jobs.append(ClassJob(class_letter, classroom_id, coursework_id, classroom_name, base_path))
 
-            os.makedirs(zips_folder, exist_ok=True)
+        list_title = list_title_ref
+        try:
+            questions_data, num_questions, score = list_questions(sheet_id, list_name_ref)
+            if not score or not questions_data:
+                print("\nA aba da planilha precisa conter número de questões e score.")
+                return
+        except Exception as e:
+            print(f"Erro ao carregar dados da planilha: {e}")
+            return
+
+        # Os índices de nomes das questões são montados uma vez e usados por todas as turmas
+        question_matcher = QuestionMatcher(questions_data)
 
-            turma_folders.append(zips_folder)
+        due_dates = get_due_dates(classroom_service, [(job.classroom_id, job.coursework_id) for job in jobs])
+
+        for job in jobs:
+            job.due_date = due_dates.get((job.classroom_id, job.coursework_id))
+            os.makedirs(job.zips_folder, exist_ok=True)
 
             metadata = ListMetadata(
-                class_name=classroom_name,
+                class_name=job.classroom_name,
                 list_name=list_title,
                 num_questions=num_questions,
                 score=score
             )
 
-            metadata_filename = f"metadata_turma{class_letter.upper()}.json"
+            metadata_filename = f"metadata_turma{job.class_letter.upper()}.json"
             metadata_path = os.path.join(base_path, metadata_filename)
             save_metadata_to_json(metadata, metadata_path)
 
-            submissions = classroom_service.courses().courseWork().studentSubmissions().list(
-                courseId=classroom_id, courseWorkId=coursework_id).execute()
-
-            print(f"\nComeçando download da turma {class_letter} ...")
-            student_list = download_submissions(classroom_service, drive_service, submissions, zips_folder, classroom_id, coursework_id)
-            print("\nDownload completo. Arquivos salvos em:", os.path.abspath(zips_folder))
+        # Os arquivos baixados ficam num armazenamento único por md5, compartilhado entre listas e turmas
+        blob_store = BlobStore(os.path.join(script_dir, "Downloads", ".blobs"))
 
-            students_filename = f"students_turma{class_letter.upper()}.json"
-            students_path = os.path.join(base_path, students_filename)
-            save_students_to_txt(student_list, students_path)
+        # Um único pool de processos para a extração dos arquivos de todas as turmas, com um processo por núcleo
+        # Com --profile as turmas rodam uma de cada vez, para as etapas não se sobreporem no tracemalloc
+        class_workers = 1 if profiling_enabled() else len(jobs)
+        with create_extraction_pool() as extraction_pool, ThreadPoolExecutor(max_workers=class_workers) as executor:
+            futures = [
+                executor.submit(process_class, job, list_title, question_matcher, blob_store, creds, None, extraction_pool)
+                for job in jobs
+            ]
+            turma_folders = [future.result() for future in futures]
 
-            organize_extracted_files(zips_folder, student_list, formatted_class)
-            move_non_zip_files(zips_folder, formatted_class)
-            if_there_is_a_folder_inside(student_list, submissions_folder)
-            delete_subfolders_in_student_folders(submissions_folder)
-            remove_empty_folders(submissions_folder)
-            save_students_to_txt(student_list, students_path)
-
-            print("\nProcesso de organização de pastas finalizado:", os.path.abspath(submissions_folder))
-
-            rename_files(submissions_folder, list_title, questions_data, student_list)
-            save_students_to_txt(student_list, students_path)
-            print("\nProcesso de verificação e renomeação finalizado.")
+        with log_context(stage="rename"), profile_stage("integrate_renaming"):
+            integrate_renaming(turma_folders, list_title, question_matcher)
 
-        integrate_renaming(turma_folders, list_title, questions_data)
-
-        final_submissions_folder = os.path.join(script_dir, "Downloads", formatted_list, "submissions")
+        final_submissions_folder = os.path.join(base_path, "submissions")
         os.makedirs(final_submissions_folder, exist_ok=True)
 
         for zips_folder in turma_folders:
             class_name = os.path.basename(zips_folder).replace("zips_", "")
             src_submission_path = os.path.join(zips_folder, f"submissions_{class_name}")
+            if not os.path.isdir(src_submission_path):
+                continue
+
             for student in os.listdir(src_submission_path):
                 src_path = os.path.join(src_submission_path, student)
                 dst_path = os.path.join(final_submissions_folder, student)
+                if os.path.isdir(dst_path):
+                    shutil.rmtree(dst_path)
                 shutil.move(src_path, dst_path)
             
             shutil.rmtree(src_submission_path)
@@ -130,8 +255,29 @@ def main():
 
         print("\nSubmissões unificadas em:", final_submissions_folder)
 
+        # A verificação de cópias compara os alunos de todas as turmas juntos
+        students_by_job = []
+        for job in jobs:
+            manifest = load_manifest_from_json(job.manifest_path, job.classroom_name, list_title)
+            students_by_job.append((job, load_registry_from_txt(job.students_path, manifest), manifest))
+
+        with create_extraction_pool() as copy_pool, log_context(stage="copy_detection"), profile_stage("copy_detection"):
+            detect_copies(
+                final_submissions_folder, StudentRegistry(s for _, students, _ in students_by_job for s in students),
+                list_title, copy_pool
+            )
+
+        # Fim da execução: o estado final de cada turma vira o novo arquivo de alunos e manifesto e os diários são esvaziados
+        for job, students, manifest in students_by_job:
+            compact_students(students, job.students_path, manifest=manifest)
+        print("\nVerificação de cópias finalizada.")
+
     except Exception as e:
         log_error(f"Erro no fluxo principal: {e}")
+    finally:
+        write_metrics("download")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Baixa e organiza as submissões de uma lista")
+    parser.add_argument("--profile", action="store_true", help="grava cProfile e tracemalloc de cada etapa em output/profiles/")
+    main(profile=parser.parse_args().profile)
\ No newline at end of file
@@ -0,0 +1,168 @@
+import random
+import socket
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from googleapiclient.errors import HttpError
+from gspread.exceptions import APIError
+from utils.utils import log_info
+from utils.metrics import increment, observe
+
+# Requisições por segundo, rajada máxima e chamadas simultâneas permitidas para cada API
+API_LIMITS = {
+    "classroom": {"rate": 20.0, "burst": 20, "concurrency": 16},
+    "drive": {"rate": 50.0, "burst": 50, "concurrency": 16},
+    "sheets": {"rate": 1.0, "burst": 5, "concurrency": 2},
+}
+
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 64.0
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded", "RESOURCE_EXHAUSTED")
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+class AdaptiveConcurrency:
+    # Limite de chamadas simultâneas que cai pela metade a cada throttling e volta a subir aos poucos com sucessos
+    def __init__(self, max_limit):
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self._in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self):
+        with self._condition:
+            self._successes += 1
+            if self.limit < self.max_limit and self._successes >= self.limit:
+                self.limit += 1
+                self._successes = 0
+                self._condition.notify_all()
+
+    def on_throttle(self):
+        with self._condition:
+            self.limit = max(1, self.limit // 2)
+            self._successes = 0
+
+class ApiGate:
+    def __init__(self, name, rate, burst, concurrency):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AdaptiveConcurrency(concurrency)
+
+_gates = {name: ApiGate(name, **limits) for name, limits in API_LIMITS.items()}
+
+def get_gate(api):
+    return _gates[api]
+
+def error_status(error):
+    if isinstance(error, HttpError):
+        return error.resp.status
+    if isinstance(error, APIError):
+        return error.response.status_code
+    return None
+
+def retry_after_seconds(error):
+    try:
+        if isinstance(error, HttpError):
+            value = error.resp.get('retry-after')
+        elif isinstance(error, APIError):
+            value = error.response.headers.get('Retry-After')
+        else:
+            return None
+
+        if not value:
+            return None
+        if value.isdigit():
+            return float(value)
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+def is_rate_limited(error):
+    status = error_status(error)
+    return status == 429 or (status == 403 and any(reason in str(error) for reason in RATE_LIMIT_REASONS))
+
+def is_retryable(error):
+    if isinstance(error, (ConnectionError, socket.timeout, TimeoutError)):
+        return True
+    return is_rate_limited(error) or error_status(error) in RETRYABLE_STATUS
+
+def backoff_delay(attempt, retry_after=None):
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+# Executa uma chamada de API respeitando a cota da API e repetindo em 429/5xx com backoff exponencial.
+# cost é quantas requisições a chamada consome da cota (ex: tamanho de um lote).
+# As métricas separam o tempo esperando a cota (api_wait_seconds) do tempo da chamada (api_call_duration_seconds).
+def call_with_retry(api, func, *args, cost=1, **kwargs):
+    gate = get_gate(api)
+    attempt = 0
+    while True:
+        waited = time.perf_counter()
+        gate.bucket.acquire(cost)
+        gate.concurrency.acquire()
+        started = time.perf_counter()
+        observe("api_wait_seconds", started - waited, api=api)
+        increment("api_calls_total", api=api)
+        increment("api_requests_total", cost, api=api)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            observe("api_call_duration_seconds", time.perf_counter() - started, api=api)
+            if not is_retryable(e) or attempt >= MAX_RETRIES:
+                increment("api_errors_total", api=api)
+                raise
+
+            increment("api_retries_total", api=api)
+            if is_rate_limited(e):
+                increment("api_throttled_total", api=api)
+                gate.concurrency.on_throttle()
+            delay = backoff_delay(attempt, retry_after_seconds(e))
+            log_info(f"Chamada à API {api} falhou ({e}), tentativa {attempt + 1} de {MAX_RETRIES}. Nova tentativa em {delay:.1f}s")
+            attempt += 1
+        else:
+            observe("api_call_duration_seconds", time.perf_counter() - started, api=api)
+            gate.concurrency.on_success()
+            return result
+        finally:
+            gate.concurrency.release()
+
+        time.sleep(delay)
+
+def execute(request, api, http=None):
+    return call_with_retry(api, request.execute, http=http)
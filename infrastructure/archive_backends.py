@@ -0,0 +1,167 @@
+import os
+import tarfile
+import zipfile
+import rarfile
+
+# py7zr é opcional: sem ele os .7z são reconhecidos, mas a abertura falha como um compactado inválido
+try:
+    import py7zr
+except ImportError:
+    py7zr = None
+
+# Bytes lidos do início do arquivo para reconhecer o formato (a assinatura do tar fica no offset 257)
+HEADER_SIZE = 262
+
+class TarEntry:
+    # Membro de um tar com a mesma interface usada do ZipInfo/RarInfo
+    __slots__ = ('member', 'filename', 'file_size', 'compress_size')
+
+    def __init__(self, member):
+        self.member = member
+        self.filename = member.name
+        self.file_size = member.size
+        # O tar é comprimido como um todo, então não há tamanho comprimido por membro
+        self.compress_size = member.size
+
+    def is_dir(self):
+        return self.member.isdir()
+
+class TarArchive:
+    # tar não tem diretório central: os membros são lidos um cabeçalho por vez, à medida que infolist() é percorrido,
+    # então o orçamento de extração confere cada membro antes de o fluxo seguir para o próximo (um tar.gz com
+    # arquivos demais ou grandes demais é recusado sem ser descompactado inteiro).
+    # Só pastas e arquivos regulares são expostos (links e dispositivos são ignorados).
+    def __init__(self, file, mode):
+        if isinstance(file, (str, os.PathLike)):
+            self._tar = tarfile.open(name=file, mode=mode)
+        else:
+            self._tar = tarfile.open(fileobj=file, mode=mode)
+        self._entries = []
+        self._listed = False
+
+    def infolist(self):
+        position = 0
+        while True:
+            if position < len(self._entries):
+                yield self._entries[position]
+                position += 1
+                continue
+            if self._listed:
+                return
+            member = self._tar.next()
+            if member is None:
+                self._listed = True
+            elif member.isdir() or member.isreg():
+                self._entries.append(TarEntry(member))
+
+    def open(self, entry):
+        return self._tar.extractfile(entry.member)
+
+    def close(self):
+        self._tar.close()
+
+class SevenZipEntry:
+    __slots__ = ('filename', 'file_size', 'compress_size', 'directory')
+
+    def __init__(self, info):
+        self.filename = info.filename
+        self.file_size = info.uncompressed or 0
+        self.compress_size = info.compressed or self.file_size
+        self.directory = info.is_directory
+
+    def is_dir(self):
+        return self.directory
+
+class SevenZipArchive:
+    # Cada open() descompacta só o membro pedido, então a memória usada é a de um arquivo, cujo tamanho declarado já
+    # passou pelo orçamento de extração, e não a do compactado inteiro. Num 7z sólido (um único fluxo comprimido para
+    # todos os arquivos) o começo do fluxo é descompactado de novo a cada membro.
+    def __init__(self, file):
+        if py7zr is None:
+            raise RuntimeError("py7zr não está instalado, não é possível abrir arquivos .7z")
+        self._archive = py7zr.SevenZipFile(file, 'r')
+        self._entries = [SevenZipEntry(info) for info in self._archive.list()]
+
+    def infolist(self):
+        return self._entries
+
+    def open(self, entry):
+        self._archive.reset()
+        content = self._archive.read(targets=[entry.filename])[entry.filename]
+        content.seek(0)
+        return content
+
+    def close(self):
+        self._archive.close()
+
+class ArchiveBackend:
+    # Formato de compactado: extension é o nome dado ao arquivo do aluno na pasta de downloads ({login}{extension}),
+    # extensions são as extensões reconhecidas pelo nome e signatures são pares (offset, bytes) do início do arquivo.
+    # open devolve um objeto com infolist(), open(info) e close(), como o ZipFile.
+    def __init__(self, name, extension, extensions, signatures, opener):
+        self.name = name
+        self.extension = extension
+        self.extensions = extensions
+        self.signatures = signatures
+        self.opener = opener
+
+    def matches(self, header):
+        return any(header[offset:offset + len(magic)] == magic for offset, magic in self.signatures)
+
+    def open(self, file):
+        return self.opener(file)
+
+# Em ordem de prioridade: um .tar.gz é reconhecido pela assinatura do gzip antes da do tar
+ARCHIVE_BACKENDS = [
+    ArchiveBackend('zip', '.zip', ['.zip'], [(0, b'PK\x03\x04'), (0, b'PK\x05\x06'), (0, b'PK\x07\x08')],
+                   lambda file: zipfile.ZipFile(file, 'r')),
+    ArchiveBackend('rar', '.rar', ['.rar'], [(0, b'Rar!\x1a\x07\x00'), (0, b'Rar!\x1a\x07\x01\x00')],
+                   lambda file: rarfile.RarFile(file, 'r')),
+    ArchiveBackend('7z', '.7z', ['.7z'], [(0, b'7z\xbc\xaf\x27\x1c')], SevenZipArchive),
+    ArchiveBackend('tar.gz', '.tar.gz', ['.tar.gz', '.tgz'], [(0, b'\x1f\x8b')],
+                   lambda file: TarArchive(file, 'r:gz')),
+    ArchiveBackend('tar.bz2', '.tar.bz2', ['.tar.bz2', '.tbz2'], [(0, b'BZh')],
+                   lambda file: TarArchive(file, 'r:bz2')),
+    ArchiveBackend('tar.xz', '.tar.xz', ['.tar.xz', '.txz'], [(0, b'\xfd7zXZ\x00')],
+                   lambda file: TarArchive(file, 'r:xz')),
+    ArchiveBackend('tar', '.tar', ['.tar'], [(257, b'ustar')],
+                   lambda file: TarArchive(file, 'r:')),
+]
+
+def register_backend(backend):
+    ARCHIVE_BACKENDS.append(backend)
+
+def backend_for_name(name):
+    lower_name = name.lower()
+    for backend in ARCHIVE_BACKENDS:
+        if any(lower_name.endswith(extension) for extension in backend.extensions):
+            return backend
+    return None
+
+def backend_for_header(header):
+    for backend in ARCHIVE_BACKENDS:
+        if backend.matches(header):
+            return backend
+    return None
+
+def read_header(file):
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as f:
+            return f.read(HEADER_SIZE)
+    position = file.tell()
+    header = file.read(HEADER_SIZE)
+    file.seek(position)
+    return header
+
+# Formato de um arquivo pela assinatura, com a extensão como alternativa (ex: um .zip corrompido continua sendo
+# tratado como zip). Arquivos com extensão de outro tipo não são compactados de aluno, mesmo que a assinatura
+# seja de um (ex: .docx e .jar são zips).
+def detect_backend(file, name=None):
+    name = name if name is not None else str(file)
+    by_name = backend_for_name(name)
+    if by_name is None and os.path.splitext(name)[1]:
+        return None
+    try:
+        return backend_for_header(read_header(file)) or by_name
+    except OSError:
+        return by_name
@@ -0,0 +1,212 @@
+import os
+import tempfile
+from dataclasses import dataclass
+from infrastructure.archive_backends import backend_for_header, read_header
+
+# Tamanho dos blocos copiados de cada membro do arquivo compactado para o disco
+CHUNK_SIZE = 1024 * 1024
+MACOSX_FOLDER = '__MACOSX'
+# A taxa de compressão só é conferida em membros maiores que isso, já que arquivos pequenos e repetitivos comprimem muito
+RATIO_CHECK_MIN_SIZE = 1024 * 1024
+# Compactados dentro de compactados ficam em memória até esse tamanho; acima dele vão para um arquivo temporário
+NESTED_SPOOL_SIZE = 8 * 1024 * 1024
+
+@dataclass
+class ExtractionLimits:
+    # Limites de cada compactado de aluno, contando também os compactados que estão dentro dele
+    max_total_size: int = 200 * 1024 * 1024
+    max_members: int = 5000
+    max_compression_ratio: float = 100.0
+    max_path_depth: int = 12
+    # Níveis de compactado dentro de compactado que são abertos (zip dentro de zip dentro de zip = 2)
+    max_nested_depth: int = 3
+
+class ArchiveLimitExceeded(Exception):
+    pass
+
+class ExtractionBudget:
+    # Consumo dos limites de um compactado. Os tamanhos declarados no diretório central são conferidos antes da
+    # extração e os bytes realmente descompactados durante a cópia, já que o cabeçalho de um zip bomb pode mentir.
+    # A violação levanta ArchiveLimitExceeded no momento em que acontece.
+    def __init__(self, limits=None):
+        self.limits = limits or ExtractionLimits()
+        self.members = 0
+        self.declared_size = 0
+        self.extracted_size = 0
+
+    def check_member(self, info, parts):
+        self.members += 1
+        if self.members > self.limits.max_members:
+            raise ArchiveLimitExceeded(f"mais de {self.limits.max_members} arquivos")
+        if len(parts) > self.limits.max_path_depth:
+            raise ArchiveLimitExceeded(f"caminho com mais de {self.limits.max_path_depth} níveis: {info.filename}")
+        if not info.is_dir():
+            self.declared_size += info.file_size
+            self.check_total(self.declared_size)
+            self.check_ratio(info, info.file_size)
+
+    def consume(self, info, size, member_size):
+        self.extracted_size += size
+        self.check_total(self.extracted_size)
+        self.check_ratio(info, member_size)
+
+    # Um compactado aninhado deixa de contar como arquivo: o que conta é o conteúdo dele, declarado no build_tree e
+    # descompactado na extração dos membros
+    def release_nested(self, info):
+        self.declared_size -= info.file_size
+
+    # Bloco de um compactado aninhado copiado para o spool: os bytes só contam no total quando os membros dele são
+    # extraídos, mas o fluxo continua limitado pelo total e pela taxa de compressão
+    def check_spooled(self, info, member_size):
+        self.check_total(member_size)
+        self.check_ratio(info, member_size)
+
+    def check_total(self, total):
+        if total > self.limits.max_total_size:
+            raise ArchiveLimitExceeded(f"conteúdo maior que {self.limits.max_total_size / (1024 * 1024):g} MB")
+
+    def check_ratio(self, info, member_size):
+        if member_size > RATIO_CHECK_MIN_SIZE and member_size > info.compress_size * self.limits.max_compression_ratio:
+            raise ArchiveLimitExceeded(f"taxa de compressão maior que {self.limits.max_compression_ratio:g}:1 em {info.filename}")
+
+class ArchiveMember:
+    # Arquivo de dentro de um compactado: o compactado aberto, a entrada do membro (ZipInfo, RarInfo, TarEntry...)
+    # e a posição dele na listagem do compactado
+    __slots__ = ('archive', 'info', 'position')
+
+    def __init__(self, archive, info, position):
+        self.archive = archive
+        self.info = info
+        self.position = position
+
+# Copia um membro em blocos para destination, descontando cada bloco do orçamento (com spooled, só conferindo os limites)
+def copy_member(member, destination, budget=None, spooled=False):
+    member_size = 0
+    with member.archive.open(member.info) as source:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            member_size += len(chunk)
+            if budget is not None and spooled:
+                budget.check_spooled(member.info, member_size)
+            elif budget is not None:
+                budget.consume(member.info, len(chunk), member_size)
+            destination.write(chunk)
+
+class SpooledArchive:
+    # Compactado aberto a partir do conteúdo de um membro de outro compactado, guardado num SpooledTemporaryFile.
+    # Fechá-lo fecha também o arquivo temporário.
+    def __init__(self, archive, spool):
+        self.archive = archive
+        self.spool = spool
+
+    def infolist(self):
+        return self.archive.infolist()
+
+    def open(self, info):
+        return self.archive.open(info)
+
+    def close(self):
+        try:
+            self.archive.close()
+        finally:
+            self.spool.close()
+
+# Abre um compactado que está dentro de outro direto do fluxo do membro (o CRC dele é conferido na leitura), sem
+# gravar o compactado intermediário na pasta do aluno. O formato vem da assinatura do conteúdo, com o backend
+# deduzido pelo nome como alternativa. Nem o tamanho declarado do compactado aninhado nem a cópia dele para o spool
+# são descontados do orçamento, para os bytes não serem contados duas vezes: o conteúdo já conta quando os membros
+# dele são listados e extraídos. Retorna (SpooledArchive, backend).
+def open_nested_archive(member, backend, budget=None):
+    if budget is not None:
+        budget.release_nested(member.info)
+    spool = tempfile.SpooledTemporaryFile(max_size=NESTED_SPOOL_SIZE)
+    try:
+        copy_member(member, spool, budget, spooled=True)
+        spool.seek(0)
+        detected = backend_for_header(read_header(spool)) or backend
+        return SpooledArchive(detected.open(spool), spool), detected
+    except Exception:
+        spool.close()
+        raise
+
+# Componentes do caminho de um membro, descartando os vazios, absolutos e '..' (como o extractall)
+def member_parts(member_name):
+    return [part for part in member_name.replace('\\', '/').split('/') if part not in ('', '.', '..')]
+
+def is_macosx_member(member_name):
+    return member_name.replace('\\', '/').lstrip('/').split('/')[0] == MACOSX_FOLDER
+
+# Monta a árvore de nomes de um compactado a partir do diretório central, sem descompactar nada: pastas são dicts
+# nome -> nó e arquivos são ArchiveMember. Passando tree, os membros são mesclados nela, sobrescrevendo arquivos
+# de mesmo caminho (como uma segunda extração na mesma pasta). Retorna (árvore, se algum membro __MACOSX foi ignorado).
+def build_tree(archive, tree=None, budget=None):
+    tree = {} if tree is None else tree
+    skipped_macosx = False
+
+    for position, info in enumerate(archive.infolist()):
+        parts = member_parts(info.filename)
+        if budget is not None:
+            budget.check_member(info, parts)
+
+        if is_macosx_member(info.filename):
+            skipped_macosx = True
+            continue
+        if not parts:
+            continue
+
+        node = tree
+        for part in parts[:-1]:
+            if not isinstance(node.get(part), dict):
+                node[part] = {}
+            node = node[part]
+
+        if info.is_dir():
+            if not isinstance(node.get(parts[-1]), dict):
+                node[parts[-1]] = {}
+        else:
+            node[parts[-1]] = ArchiveMember(archive, info, position)
+
+    return tree, skipped_macosx
+
+def make_dirs(path, created_dirs):
+    missing = []
+    while path and not os.path.isdir(path):
+        missing.append(path)
+        path = os.path.dirname(path)
+    for directory in reversed(missing):
+        os.mkdir(directory)
+        created_dirs.append(directory)
+
+def rollback(staged, created_dirs):
+    for part_path, _ in staged:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    for directory in reversed(created_dirs):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+
+# Grava cada (ArchiveMember, destino) lendo o membro uma única vez: o CRC é conferido pelo próprio leitor do membro
+# enquanto os dados são copiados para um arquivo .part ao lado do destino. Só quando todos os membros foram lidos
+# sem erro os .part são renomeados para o destino; se algum falhar, tudo o que foi escrito é desfeito e a exceção
+# é repassada. Os membros são lidos na ordem em que estão no compactado, o que evita voltar no fluxo de um tar.gz.
+def write_members(members, budget=None):
+    staged = []
+    created_dirs = []
+
+    try:
+        for index, (member, target) in enumerate(sorted(members, key=lambda item: item[0].position)):
+            make_dirs(os.path.dirname(target), created_dirs)
+            part_path = os.path.join(os.path.dirname(target), f".{os.path.basename(target)}.{index}.part")
+            staged.append((part_path, target))
+            with open(part_path, 'wb') as destination:
+                copy_member(member, destination, budget)
+
+        for part_path, target in staged:
+            os.replace(part_path, target)
+    except Exception:
+        rollback(staged, created_dirs)
+        raise
@@ -1,5 +1,8 @@
 import os
+import threading
 import gspread
+import httplib2
+import google_auth_httplib2
 from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
@@ -17,6 +20,8 @@ SECRETS_DIR = "secrets"
 CREDENTIALS_PATH = os.path.join(SECRETS_DIR, "credentials.json")
 TOKEN_PATH = os.path.join(SECRETS_DIR, "token.json")
 
+_thread_local = threading.local()
+
 def get_credentials():
     try:
         creds = None
@@ -43,4 +48,17 @@ def get_gspread_client():
         creds = get_credentials()
         return gspread.authorize(creds)
     except Exception as e:
-        log_error(f"Erro em conseguir a credencial do google spreadsheet {str(e)}")
\ No newline at end of file
+        log_error(f"Erro em conseguir a credencial do google spreadsheet {str(e)}")
+
+def get_thread_http(creds):
+    # httplib2.Http não é thread-safe: cada worker precisa do seu próprio objeto autorizado
+    try:
+        http = getattr(_thread_local, "http", None)
+        if http is None or getattr(_thread_local, "creds", None) is not creds:
+            http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+            _thread_local.http = http
+            _thread_local.creds = creds
+        return http
+    except Exception as e:
+        log_error(f"Erro ao criar http autorizado para a thread: {str(e)}")
+        return None
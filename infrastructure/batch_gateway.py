@@ -0,0 +1,98 @@
+import time
+from infrastructure.api_executor import (call_with_retry, get_gate, is_rate_limited, is_retryable, backoff_delay,
+                                         retry_after_seconds, MAX_RETRIES)
+from utils.utils import log_error, log_info
+from utils.metrics import increment
+
+# Limite de chamadas por lote aceito pelas APIs do Google
+MAX_BATCH_SIZE = 100
+
+class BatchRequestQueue:
+    # Acumula chamadas independentes da mesma API e envia até MAX_BATCH_SIZE delas por requisição HTTP.
+    # Cada chamada recebe de volta (response, exception) no callback informado em add().
+    # Chamadas do lote que falham com 429/5xx são reenviadas num novo lote, com backoff.
+    def __init__(self, service, api, http=None, max_batch_size=MAX_BATCH_SIZE):
+        self.service = service
+        self.api = api
+        self.http = http
+        self.max_batch_size = max_batch_size
+        self._pending = []
+
+    def add(self, request, callback):
+        self._pending.append((request, callback))
+        if len(self._pending) >= self.max_batch_size:
+            self.flush()
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        attempt = 0
+
+        while pending:
+            answered = set()
+            retry = []
+
+            def on_response(request_id, response, exception):
+                index = int(request_id)
+                answered.add(index)
+                request, callback = pending[index]
+
+                if exception is not None and is_retryable(exception) and attempt < MAX_RETRIES:
+                    retry.append((request, callback, exception))
+                    return
+
+                try:
+                    callback(response, exception)
+                except Exception as e:
+                    log_error(f"Erro ao tratar resposta do lote (requisição {request_id}): {e}")
+
+            batch = self.service.new_batch_http_request(callback=on_response)
+            for index, (request, _) in enumerate(pending):
+                batch.add(request, request_id=str(index))
+
+            try:
+                call_with_retry(self.api, batch.execute, http=self.http, cost=len(pending))
+            except Exception as e:
+                log_error(f"Erro ao executar lote de {len(pending)} requisições: {e}")
+                for index, (_, callback) in enumerate(pending):
+                    if index not in answered:
+                        callback(None, e)
+                return
+
+            if not retry:
+                return
+
+            errors = [error for _, _, error in retry]
+            increment("api_retries_total", len(retry), api=self.api)
+            if any(is_rate_limited(error) for error in errors):
+                get_gate(self.api).concurrency.on_throttle()
+            delay = max(backoff_delay(attempt, retry_after_seconds(error)) for error in errors)
+            log_info(f"{len(retry)} requisições do lote da API {self.api} falharam, reenviando em {delay:.1f}s")
+            time.sleep(delay)
+
+            attempt += 1
+            pending = [(request, callback) for request, callback, _ in retry]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+# Executa um dicionário chave -> HttpRequest em lotes e devolve (respostas, erros) indexados pela mesma chave
+def execute_batch(service, api, requests, http=None, max_batch_size=MAX_BATCH_SIZE):
+    results = {}
+    errors = {}
+
+    def collect(key):
+        def callback(response, exception):
+            if exception is not None:
+                errors[key] = exception
+            else:
+                results[key] = response
+        return callback
+
+    with BatchRequestQueue(service, api, http, max_batch_size) as queue:
+        for key, request in requests.items():
+            queue.add(request, collect(key))
+
+    return results, errors
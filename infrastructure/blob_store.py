@@ -0,0 +1,76 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from utils.utils import log_error, log_info
+
+class HashingWriter:
+    # Arquivo de escrita que calcula o md5 do conteúdo enquanto ele é gravado, sem uma segunda leitura
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'wb')
+        self._md5 = hashlib.md5()
+        self.size = 0
+
+    def write(self, data):
+        self._md5.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._md5.hexdigest()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class BlobStore:
+    # Guarda cada arquivo baixado uma única vez, pelo seu md5, em <root>/<md5[:2]>/<md5>.
+    # As pastas dos alunos recebem hardlinks para os blobs.
+    def __init__(self, root):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path_for(self, md5):
+        return os.path.join(self.root, md5[:2], md5)
+
+    def has(self, md5):
+        return bool(md5) and os.path.isfile(self.path_for(md5))
+
+    def open_writer(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        os.close(fd)
+        return HashingWriter(tmp_path)
+
+    def commit(self, writer, expected_md5=''):
+        digest = writer.hexdigest()
+        if expected_md5 and digest != expected_md5:
+            os.remove(writer.path)
+            log_error(f"md5 do arquivo baixado ({digest}) diferente do informado pelo Drive ({expected_md5})")
+            return None
+
+        blob_path = self.path_for(digest)
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.replace(writer.path, blob_path)
+        return digest
+
+    def discard(self, writer):
+        if os.path.exists(writer.path):
+            os.remove(writer.path)
+
+    def link_into(self, md5, destination):
+        blob_path = self.path_for(md5)
+        if os.path.lexists(destination):
+            os.remove(destination)
+        try:
+            os.link(blob_path, destination)
+        except OSError as e:
+            log_info(f"Não foi possível criar hardlink para {destination} ({e}), copiando o arquivo.")
+            shutil.copyfile(blob_path, destination)
+        return destination
@@ -1,32 +1,78 @@
 from googleapiclient.errors import HttpError
-from utils.utils import log_error
+from infrastructure.api_executor import execute
+from infrastructure.batch_gateway import execute_batch
+from utils.utils import log_error, parse_due_date
 import re
 
+DEFAULT_PAGE_SIZE = 100
+ROSTER_FIELDS = "nextPageToken,students(userId,profile(emailAddress,name/fullName))"
+
+# Percorre um endpoint paginado seguindo o nextPageToken e devolve os itens página a página
+def iter_pages(list_method, items_key, page_size=DEFAULT_PAGE_SIZE, **kwargs):
+    page_token = None
+    while True:
+        response = execute(list_method(pageSize=page_size, pageToken=page_token, **kwargs), "classroom")
+
+        for item in response.get(items_key, []):
+            yield item
+
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return
+
+def iter_courses(service, page_size=DEFAULT_PAGE_SIZE):
+    return iter_pages(service.courses().list, "courses", page_size)
+
+def iter_course_work(service, classroom_id, page_size=DEFAULT_PAGE_SIZE):
+    return iter_pages(service.courses().courseWork().list, "courseWork", page_size, courseId=classroom_id)
+
+def iter_student_submissions(service, classroom_id, coursework_id, page_size=DEFAULT_PAGE_SIZE):
+    return iter_pages(
+        service.courses().courseWork().studentSubmissions().list, "studentSubmissions", page_size,
+        courseId=classroom_id, courseWorkId=coursework_id
+    )
+
+def is_pif_course(course, semester):
+    return semester in course["name"] and "PIF" in course["name"]
+
+# Descobre as turmas do semestre a partir do nome das disciplinas ("... TURMA A", "... TURMA B", ...)
+def list_class_letters(service, semester):
+    try:
+        letters = []
+        for course in iter_courses(service):
+            if not is_pif_course(course, semester):
+                continue
+            match = re.search(r"TURMA\s+([A-Z0-9]+)", course["name"].upper())
+            if match and match.group(1) not in letters:
+                letters.append(match.group(1))
+        return sorted(letters)
+
+    except HttpError as http_err:
+        log_error(f"Erro na API do Classroom ao listar turmas: {http_err}")
+        return []
+    except Exception as e:
+        log_error(f"Erro inesperado ao listar turmas: {e}")
+        return []
+
 def list_classroom_data(service, semester, turma_type, saved_assignment_title=None):
     try:
-        results = service.courses().list().execute()
-        courses = results.get("courses", [])
-        pif_courses = [
-            course for course in courses 
-            if semester in course["name"] and "PIF" in course["name"] and turma_type.upper() in course["name"].upper()
-        ]
+        classroom = next((
+            course for course in iter_courses(service)
+            if is_pif_course(course, semester) and turma_type.upper() in course["name"].upper()
+        ), None)
 
-        if not pif_courses:
+        if not classroom:
             print(f"Nenhuma turma encontrada para {semester} {turma_type}.\n")
             return None, None, None, None, None
 
-        classroom = pif_courses[0]  
         classroom_id = classroom["id"]
         classroom_name = classroom["name"]
 
         print(f"\nTurma selecionada automaticamente: {classroom_name}\n")
 
         print("Buscando listas de exercícios...\n")
-        assignments = service.courses().courseWork().list(courseId=classroom_id).execute()
-        course_work = assignments.get("courseWork", [])
-
         valid_assignments = [
-            a for a in course_work if any(k in a["title"].upper() for k in ["LISTA", "LISTAS"])
+            a for a in iter_course_work(service, classroom_id) if any(k in a["title"].upper() for k in ["LISTA", "LISTAS"])
         ]
 
         valid_assignments = valid_assignments[::-1]
@@ -68,3 +114,48 @@ def list_classroom_data(service, semester, turma_type, saved_assignment_title=No
     except Exception as e:
         log_error(f"Erro inesperado ao selecionar dados do Classroom: {e}")
         return None, None, None, None, None
+
+# Monta um índice userId -> profile com todos os alunos da turma
+def load_course_roster(service, classroom_id, page_size=DEFAULT_PAGE_SIZE):
+    roster = {}
+    try:
+        students = iter_pages(
+            service.courses().students().list, "students", page_size, courseId=classroom_id, fields=ROSTER_FIELDS
+        )
+        for student in students:
+            roster[student["userId"]] = student["profile"]
+
+        return roster
+
+    except HttpError as http_err:
+        log_error(f"Erro na API do Classroom ao carregar alunos da turma {classroom_id}: {http_err}")
+        return roster
+    except Exception as e:
+        log_error(f"Erro inesperado ao carregar alunos da turma {classroom_id}: {e}")
+        return roster
+
+def get_due_date(classroom_service, classroom_id, coursework_id):
+    try:
+        coursework = execute(classroom_service.courses().courseWork().get(
+            courseId=classroom_id, id=coursework_id), "classroom")
+        return parse_due_date(coursework)
+    except Exception as e:
+        log_error(f"Erro ao obter data de entrega: {e}")
+        return None
+
+# Busca as datas de entrega de várias atividades (pares classroom_id, coursework_id) numa única requisição em lote
+def get_due_dates(classroom_service, courseworks):
+    try:
+        requests = {
+            (classroom_id, coursework_id): classroom_service.courses().courseWork().get(courseId=classroom_id, id=coursework_id)
+            for classroom_id, coursework_id in courseworks
+        }
+        results, errors = execute_batch(classroom_service, "classroom", requests)
+
+        for key, error in errors.items():
+            log_error(f"Erro ao obter data de entrega de {key}: {error}")
+
+        return {key: parse_due_date(results[key]) if key in results else None for key in requests}
+    except Exception as e:
+        log_error(f"Erro ao obter datas de entrega: {e}")
+        return {}
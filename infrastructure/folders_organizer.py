@@ -1,261 +1,289 @@
 import os
 import shutil
-import zipfile
-import rarfile
 from utils.utils import log_info, log_error
+from utils.log_writer import log_context
+from utils.metrics import increment, timed
+from infrastructure.archive_backends import ARCHIVE_BACKENDS, backend_for_name, detect_backend
+from infrastructure.archive_extractor import (ArchiveMember, ArchiveLimitExceeded, ExtractionBudget, open_nested_archive,
+                                              build_tree, write_members)
 from core.models.student_submission import StudentSubmission
 
-def is_real_zip(file_path):
-    try:
-        with zipfile.ZipFile(file_path, 'r') as zip_ref:
-            return zip_ref.testzip() is None
-    except Exception as e:
-        log_error(f"Erro ao verificar se é um zip: {str(e)}")
-        return False
+NESTED_ARCHIVE_COMMENTS = {
+    'zip': "Erro de formatação de pasta: zip dentro do zip.",
+    'rar': "Erro de formatação de pasta: rar dentro do rar.",
+}
+# Subpastas criadas pela IDE ou pela compilação
+BUILD_FOLDERS = ['output', '.vscode']
+
+class StudentChanges:
+    # Registra as alterações feitas num aluno dentro de um processo worker, para aplicá-las depois no aluno original
+    def __init__(self, login, name):
+        self.login = login
+        self.name = name
+        self.fields = {}
+        self.comments = []
+
+    def update_field(self, field, value):
+        self.fields[field] = value
+
+    def add_comment(self, text):
+        if text:
+            self.comments.append(text)
+
+    def apply_to(self, student):
+        for field, value in self.fields.items():
+            student.update_field(field, value)
+        for comment in self.comments:
+            student.add_comment(comment)
+
+class ExtractionPlan:
+    # Layout final da pasta do aluno, calculado só com a lista de nomes dos compactados, antes de qualquer escrita.
+    # files mapeia o nome de cada arquivo na pasta (plana) do aluno para o membro de onde ele é extraído;
+    # changes guarda os diagnósticos de formatação, que só valem se o compactado do aluno for extraído.
+    # budget é compartilhado pelo compactado do aluno e pelos compactados dentro dele.
+    def __init__(self, login, name, limits=None):
+        self.login = login
+        self.changes = StudentChanges(login, name)
+        self.budget = ExtractionBudget(limits)
+        self.files = {}
+        self.sources = []
+
+    def add_source(self, archive, archive_path, backend):
+        self.sources.append((archive, archive_path, backend))
+
+    def members_of(self, archive, extraction_path):
+        return [
+            (member, os.path.join(extraction_path, file_name))
+            for file_name, member in self.files.items() if member.archive is archive
+        ]
+
+    def close(self):
+        for archive, _, _ in self.sources:
+            archive.close()
+
+def report_invalid_archive(archive_path, backend, student, error):
+    if backend.name == 'zip':
+        log_error(f"Erro ao verificar se é um zip: {str(error)}")
+        log_info(f"O arquivo {archive_path} não é um .zip válido.")
+        student.update_field('entregou', 0)
+        student.add_comment(f"O arquivo {archive_path} não é um .zip válido.")
+    else:
+        log_info(f"Erro ao abrir o arquivo {backend.name} {archive_path}: {error}")
+
+def report_empty_submission(student):
+    student.update_field('entregou', 0)
+    student.update_field('formatacao', 0)
+    student.add_comment("Erro de submissão: zip vazio")
+
+def report_rejected_archive(archive_path, extraction_path, student, error):
+    log_info(f"O arquivo {archive_path} foi rejeitado: {error}")
+    if os.path.isdir(extraction_path):
+        shutil.rmtree(extraction_path)
+    student.update_field('entregou', 0)
+    student.add_comment(f"Erro de submissão: compactado rejeitado por exceder o limite de extração ({error}).")
+
+def report_macosx(skipped_macosx, archive_path, changes):
+    if skipped_macosx:
+        log_info(f"Ignorando pasta __MACOSX de {archive_path}")
+        changes.add_comment("Deletado pasta __MACOSX")
+
+# Achata a árvore na pasta do aluno: primeiro os arquivos da raiz e depois os das subpastas, nível a nível, então num
+# conflito de nomes fica o arquivo menos profundo. Pastas ocultas e arquivos ocultos dentro de subpastas são descartados.
+def flatten_tree(tree, changes):
+    files = {}
+    level = [(tree, True)]
+
+    while level:
+        next_level = []
+        for folder, is_root in level:
+            for item_name in list(folder):
+                node = folder[item_name]
+                if isinstance(node, dict):
+                    if item_name.startswith('.'):
+                        continue
+                    changes.update_field('formatacao', 0)
+                    if item_name in BUILD_FOLDERS:
+                        changes.add_comment(f"Erro de formatação de pasta: output ou .vscode")
+                    else:
+                        changes.add_comment(f"Erro de formatação de pasta: subpastas como {item_name} foram movidas.")
+                    next_level.append((node, False))
+                elif is_root or not item_name.startswith('.'):
+                    if item_name in files:
+                        log_info(f"Arquivo {item_name} de {changes.login} ignorado: já existe um arquivo com esse nome na pasta.")
+                    else:
+                        files[item_name] = node
+        level = next_level
+
+    return files
+
+def plan_student_files(plan, archive, archive_path, extraction_path):
+    login = plan.login
+    changes = plan.changes
+
+    tree, skipped_macosx = build_tree(archive, budget=plan.budget)
+    report_macosx(skipped_macosx, archive_path, changes)
+    if not tree:
+        report_empty_submission(changes)
+        return plan
+
+    if len(tree) == 1:
+        folder_name, node = next(iter(tree.items()))
+        if isinstance(node, dict) and folder_name != login:
+            log_info(f"Pasta renomeada de {folder_name} para {login}")
+            if folder_name.lower() != login:
+                changes.update_field('formatacao', 0)
+                changes.add_comment(f"Erro de formatação de pasta: pasta renomeada de {folder_name} para {login}.")
+            tree = {login: node}
+
+    # Compactados na raiz do compactado do aluno têm os membros mesclados na raiz, como se fossem extraídos ali.
+    # Os compactados que aparecem na raiz depois disso são abertos no nível seguinte, até max_nested_depth.
+    max_nested_depth = plan.budget.limits.max_nested_depth
+    depth = 1
+    while True:
+        nested_members = [
+            (item_name, node, backend_for_name(item_name)) for item_name, node in tree.items()
+            if isinstance(node, ArchiveMember) and backend_for_name(item_name) is not None
+        ]
+        if not nested_members:
+            break
+        if depth > max_nested_depth:
+            log_info(f"Compactados de {login} com mais de {max_nested_depth} níveis não foram extraídos: {[name for name, _, _ in nested_members]}")
+            changes.update_field('formatacao', 0)
+            changes.add_comment(f"Erro de formatação de pasta: compactados aninhados em mais de {max_nested_depth} níveis não foram extraídos.")
+            break
+
+        for item_name, node, backend in nested_members:
+            # Um compactado mesclado antes pode ter sobrescrito esse nome
+            if tree.get(item_name) is not node:
+                continue
+            changes.update_field('formatacao', 0)
+            changes.add_comment(NESTED_ARCHIVE_COMMENTS.get(backend.name, f"Erro de formatação de pasta: {backend.name} dentro do compactado."))
+            del tree[item_name]
 
-def extract_zip(student_login, zip_file_path, extraction_path, student_obj):
+            nested_path = os.path.join(extraction_path, item_name)
+            try:
+                nested, backend = open_nested_archive(node, backend, plan.budget)
+            except ArchiveLimitExceeded:
+                raise
+            except Exception as e:
+                report_invalid_archive(nested_path, backend, changes, e)
+                continue
+            plan.add_source(nested, nested_path, backend)
+            tree, skipped_macosx = build_tree(nested, tree, plan.budget)
+            report_macosx(skipped_macosx, nested_path, changes)
+        depth += 1
+
+    log_info(f"\nArquivos extraídos de {login}: {list(tree)}")
+    if len(tree) == 1:
+        item_name, node = next(iter(tree.items()))
+        if isinstance(node, dict):
+            if item_name == login:
+                log_info(f"A pasta extraída {item_name} já tem o nome correto. Movendo arquivos para {extraction_path}.")
+                if not node:
+                    changes.update_field('entregou', 0)
+                    changes.update_field('formatacao', 0)
+                    changes.add_comment("Não tem arquivos dentro da pasta: pasta deletada.")
+            else:
+                log_info(f"A pasta extraída {item_name} é diferente do nome esperado {login}")
+                changes.update_field('formatacao', 0)
+                changes.add_comment(f"Erro de formatação de pasta: a pasta extraída {item_name} é diferente do nome esperado {login}.")
+            tree = node
+        else:
+            log_info(f"Erro de formatação: {login} enviou arquivos soltos sem pasta.")
+            changes.update_field('formatacao', 0)
+            changes.add_comment("Erro de formatação de pasta: enviou sem pasta")
+
+    plan.files = flatten_tree(tree, changes)
+    return plan
+
+# Calcula o layout final da pasta do aluno a partir dos nomes do compactado e extrai cada membro direto para o
+# caminho final, numa única passada de escrita por compactado. Um compactado que passa dos limites (tamanho,
+# quantidade de arquivos, taxa de compressão ou profundidade) é rejeitado assim que o limite é atingido.
+def organize_student_files(download_folder, submissions_folder, student, limits=None):
+    plan = ExtractionPlan(student.login, student.name, limits)
+    archive_path = extraction_path = None
     try:
-        if not is_real_zip(zip_file_path):
-            log_info(f"O arquivo {zip_file_path} não é um .zip válido.")
-            student_obj.update_field('entregou', 0)
-            student_obj.add_comment(f"O arquivo {zip_file_path} não é um .zip válido.")
+        student_login = student.login
+        candidates = [os.path.join(download_folder, f"{student_login}{backend.extension}") for backend in ARCHIVE_BACKENDS]
+        archive_path = next((path for path in candidates if os.path.exists(path)), None)
+        if archive_path is None:
             return
 
-        with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-            zip_ref.extractall(extraction_path)
-
-        macosx_path = os.path.join(extraction_path, '__MACOSX')
-        if os.path.exists(macosx_path):
-            log_info(f"Removendo pasta __MACOSX de {extraction_path}")
-            shutil.rmtree(macosx_path)
-            student_obj.add_comment("Deletado pasta __MACOSX")
-
-    except Exception as e:
-        log_error(f"Erro ao extrair o zip: {str(e)}") 
-
-def extract_rar(student_login, rar_file_path, extraction_path, student_obj):
-    try:
+        # O formato vem da assinatura do arquivo: um .zip que na verdade é um rar é aberto como rar
+        backend = detect_backend(archive_path)
+        extraction_path = os.path.join(submissions_folder, student_login)
         try:
-            with rarfile.RarFile(rar_file_path, 'r') as rar_ref:
-                rar_ref.extractall(extraction_path)
-        except rarfile.Error as e:
-            log_info(f"Erro ao usar rarfile: {e}")
-            log_info(f"Tentando extrair com unar...")
-
-        macosx_path = os.path.join(extraction_path, '__MACOSX')
-        if os.path.exists(macosx_path):
-            log_info(f"Removendo pasta __MACOSX de {extraction_path}")
-            shutil.rmtree(macosx_path)
-            student_obj.add_comment("Deletado pasta __MACOSX")
+            archive = backend.open(archive_path)
+        except Exception as e:
+            report_invalid_archive(archive_path, backend, student, e)
+            report_empty_submission(student)
+            return
+        plan.add_source(archive, archive_path, backend)
 
-    except Exception as e:
-        log_error(f"Erro ao extrair o rar: {str(e)}")
+        plan_student_files(plan, archive, archive_path, extraction_path)
 
-def move_file(source, destination):
-    try:
         try:
-            shutil.move(source, destination)
-        except shutil.Error as e:
-            log_info(f"Erro ao mover arquivo: {e}")
-    except Exception as e:
-        log_error(f"Erro ao mover o arquivo {str(e)}")  
-
-def create_folder_if_not_exists(folder_path):
-    try:
-        if not os.path.exists(folder_path):
-                os.makedirs(folder_path)
-    except Exception as e:
-        log_error(f"Erro em criar a pasta se não existir a pasta {str(e)}")       
+            write_members(plan.members_of(archive, extraction_path), plan.budget)
+        except ArchiveLimitExceeded:
+            raise
+        except Exception as e:
+            report_invalid_archive(archive_path, backend, student, e)
+            report_empty_submission(student)
+            return
 
-def rename_directory_if_needed(directory_path, expected_name, student_obj):
-    try:
-        if os.path.isdir(directory_path):
-            current_name = os.path.basename(directory_path)
-            if current_name != expected_name:
-                new_directory_path = os.path.join(os.path.dirname(directory_path), expected_name)
-                os.rename(directory_path, new_directory_path)
-                log_info(f"Pasta renomeada de {current_name} para {expected_name}")
-                if current_name.lower() != expected_name:
-                    student_obj.update_field('formatacao', 0)
-                    student_obj.add_comment(f"Erro de formatação de pasta: pasta renomeada de {current_name} para {expected_name}.")
-                return new_directory_path
-        return directory_path
+        for nested, nested_path, nested_backend in plan.sources[1:]:
+            try:
+                write_members(plan.members_of(nested, extraction_path), plan.budget)
+            except ArchiveLimitExceeded:
+                raise
+            except Exception as e:
+                report_invalid_archive(nested_path, nested_backend, plan.changes, e)
+
+        # Os diagnósticos de formatação só chegam ao aluno com todos os compactados gravados: se um deles for
+        # rejeitado pelo orçamento, plan.changes é descartado e fica só o comentário da rejeição
+        plan.changes.apply_to(student)
+
+    except ArchiveLimitExceeded as e:
+        report_rejected_archive(archive_path, extraction_path, student, e)
     except Exception as e:
-        log_error(f"Erro ao renomear o diretório se necessário: {str(e)}")
-
-def organize_extracted_files(download_folder, students, class_name):
+        log_error(f"Erro ao organizar arquivos extraídos de {student.login}: {str(e)}")
+    finally:
+        plan.close()
+
+def organize_student_files_worker(download_folder, submissions_folder, login, name, limits=None):
+    changes = StudentChanges(login, name)
+    with log_context(stage="organize", login=login):
+        organize_student_files(download_folder, submissions_folder, changes, limits)
+    return changes
+
+# Com um executor (ex: ProcessPoolExecutor) a extração de cada aluno roda em paralelo e as alterações
+# voltam para os alunos na ordem da lista. limits (ExtractionLimits) vale para cada compactado de aluno.
+@timed("organize_extracted_files")
+def organize_extracted_files(download_folder, students, class_name, executor=None, limits=None):
     try:
         submissions_folder = os.path.join(download_folder, f"submissions_{class_name}")
         os.makedirs(submissions_folder, exist_ok=True)
+        increment("organized_students_total", len(students))
 
-        for student in students:
-            student_login = student.login
-            zip_path = os.path.join(download_folder, f"{student_login}.zip")
-            rar_path = os.path.join(download_folder, f"{student_login}.rar")
-            extraction_path = os.path.join(submissions_folder, student_login)
-            create_folder_if_not_exists(extraction_path)
+        if executor is None:
+            for student in students:
+                with log_context(login=student.login):
+                    organize_student_files(download_folder, submissions_folder, student, limits)
+            return
 
+        futures = [
+            executor.submit(organize_student_files_worker, download_folder, submissions_folder, student.login, student.name, limits)
+            for student in students
+        ]
+        # Erro na extração de um aluno não interrompe a aplicação dos resultados dos outros
+        for student, future in zip(students, futures):
             try:
-                if os.path.exists(zip_path):
-                    extract_zip(student_login, zip_path, extraction_path, student)
-                elif os.path.exists(rar_path):
-                    extract_rar(student_login, rar_path, extraction_path, student)
-                else:
-                    continue
-            except (zipfile.BadZipFile, rarfile.Error) as e:
-                log_info(f"Erro ao extrair o arquivo de {student_login}: {e}")
-                student.update_field('entregou', 0)
-                student.update_field('formatacao', 0)
-                student.add_comment("Erro de submissão: compactação com erro")
-                continue
-
-            extracted_items = os.listdir(extraction_path)
-            if not extracted_items:
-                student.update_field('entregou', 0)
-                student.update_field('formatacao', 0)
-                student.add_comment("Erro de submissão: zip vazio")
-                continue
-
-            if len(extracted_items) == 1 and os.path.isdir(os.path.join(extraction_path, extracted_items[0])):
-                extracted_folder = os.path.join(extraction_path, extracted_items[0])
-                rename_directory_if_needed(extracted_folder, student_login, student)
-
-            for extracted_item in os.listdir(extraction_path):
-                extracted_item_path = os.path.join(extraction_path, extracted_item)
-
-                if os.path.exists(extracted_item_path) and os.path.isfile(extracted_item_path):
-                    if extracted_item.endswith('.zip'):
-                        student.update_field('formatacao', 0)
-                        student.add_comment("Erro de formatação de pasta: zip dentro do zip.")
-                        try:
-                            extract_zip(student_login, extracted_item_path, extraction_path, student)
-                            os.remove(extracted_item_path)
-                        except zipfile.BadZipFile:
-                            log_info(f"Erro ao extrair zip: {extracted_item_path}")
-                    elif extracted_item.endswith('.rar'):
-                        student.update_field('formatacao', 0)
-                        student.add_comment("Erro de formatação de pasta: rar dentro do rar.")
-                        try:
-                            extract_rar(student_login, extracted_item_path, extraction_path, student)
-                            os.remove(extracted_item_path)
-                        except rarfile.Error:
-                            log_info(f"Erro ao extrair rar: {extracted_item_path}")
-
-            extracted_items = os.listdir(extraction_path)
-            log_info(f"\nArquivos extraídos de {student_login}: {extracted_items}")
-            for_not_executed = True
-            if len(extracted_items) == 1:
-                extracted_path = os.path.join(extraction_path, extracted_items[0])
-
-                if os.path.isdir(extracted_path):
-                    extracted_folder = extracted_path
-
-                    if extracted_items[0] == student_login:
-                        log_info(f"A pasta extraída {extracted_items[0]} já tem o nome correto. Movendo arquivos para {extraction_path}.")
-
-                        for file in os.listdir(extracted_folder):
-                            for_not_executed = False
-                            source_file_path = os.path.join(extracted_folder, file)
-                            destination_file_path = os.path.join(extraction_path, file)
-
-                            if os.path.exists(source_file_path):
-                                log_info(f"Movendo arquivo: {source_file_path} -> {destination_file_path}")
-                                move_file(source_file_path, destination_file_path)
-                            else:
-                                log_info(f"Arquivo não encontrado: {source_file_path}")
-
-                        if not os.listdir(extracted_folder):
-                            shutil.rmtree(extracted_folder)
-                            log_info(f"Pasta extra deletada: {extracted_folder}")
-                            if for_not_executed:
-                                student.update_field('entregou', 0)
-                                student.update_field('formatacao', 0)
-                                student.add_comment("Não tem arquivos dentro da pasta: pasta deletada.")
-                        else:
-                            log_info(f"Pasta extra {extracted_folder} ainda contém arquivos e não será deletada.")
-                    else:
-                        log_info(f"A pasta extraída {extracted_items[0]} é diferente do nome esperado {student_login}")
-                        student.update_field('formatacao', 0)
-                        student.add_comment(f"Erro de formatação de pasta: a pasta extraída {extracted_items[0]} é diferente do nome esperado {student_login}.")
-
-                        for file in os.listdir(extracted_folder):
-                            source_file_path = os.path.join(extracted_folder, file)
-                            destination_file_path = os.path.join(extraction_path, file)
-
-                            if os.path.exists(source_file_path):
-                                log_info(f"Movendo arquivo: {source_file_path} -> {destination_file_path}")
-                                move_file(source_file_path, destination_file_path)
-                            else:
-                                log_info(f"Arquivo não encontrado: {source_file_path}")
-
-                        shutil.rmtree(extracted_folder)
-                        log_info(f"Pasta deletada: {extracted_folder}")
-                else:
-                    log_info(f"Erro de formatação: {student_login} enviou arquivos soltos sem pasta.")
-                    student.update_field('formatacao', 0)
-                    student.add_comment("Erro de formatação de pasta: enviou sem pasta")
+                future.result().apply_to(student)
+            except Exception as e:
+                log_error(f"Erro ao organizar arquivos de {student.login}: {str(e)}")
     except Exception as e:
         log_error(f"Erro ao organizar arquivos extraídos: {str(e)}")
 
-def if_there_is_a_folder_inside(students, submissions_folder):
-    try:
-        def move_files_to_inicial_folder(first_folder, folder_name, student):
-            if os.path.basename(first_folder).startswith('.'):
-                return
-
-            items = os.listdir(first_folder)
-            
-            subfolders = [item for item in items if os.path.isdir(os.path.join(first_folder, item)) and not item.startswith('.')]
-            
-            if subfolders:
-                for subfolder in subfolders:
-                    subfolder_path = os.path.join(first_folder, subfolder)
-
-                    if subfolder in ['output', '.vscode']:
-                        student.update_field('formatacao', 0)
-                        student.add_comment(f"Erro de formatação de pasta: output ou .vscode")
-                    else:
-                        student.update_field('formatacao', 0)
-                        student.add_comment(f"Erro de formatação de pasta: subpastas como {subfolder} foram movidas.")
-                    
-                    move_files_to_inicial_folder(subfolder_path, folder_name, student)
-            
-            files = [item for item in items if os.path.isfile(os.path.join(first_folder, item)) and not item.startswith('.')]
-            for file in files:
-                file_path = os.path.join(first_folder, file)
-                destination = os.path.join(submissions_folder, os.path.basename(first_folder), file)
-
-                if not os.path.exists(os.path.dirname(destination)):
-                    os.makedirs(os.path.dirname(destination))
-
-                shutil.move(file_path, destination)
-            
-            if first_folder != submissions_folder and not os.listdir(first_folder):
-                os.rmdir(first_folder)
-
-        for student in students:
-            folder_name = student.login
-            folder_path = os.path.join(submissions_folder, folder_name)
-            if os.path.isdir(folder_path) and not folder_name.startswith('.'):
-                move_files_to_inicial_folder(folder_path, folder_name, student)
-
-    except Exception as e:
-        log_error(f"Erro se existe uma pasta dentro da pasta: {str(e)}")
-
-def delete_subfolders_in_student_folders(submissions_folder):
-    try:
-        for student_folder in os.listdir(submissions_folder):
-            student_folder_path = os.path.join(submissions_folder, student_folder)
-
-            if os.path.isdir(student_folder_path): 
-                for item in os.listdir(student_folder_path):
-                    item_path = os.path.join(student_folder_path, item)
-
-                    if os.path.isdir(item_path): 
-                        shutil.rmtree(item_path)
-    except Exception as e:
-        log_error(f"Erro ao deletar pastas dentro das pastas dos estudantes: {str(e)}")
-
 def move_non_zip_files(download_folder, class_name):
     try:
         submissions_folder = os.path.join(download_folder, f"submissions_{class_name}")
@@ -267,12 +295,3 @@ def move_non_zip_files(download_folder, class_name):
                     os.rename(item_path, destination_folder)
     except Exception as e:
         log_error(f"Erro ao mover arquivos que não estavam zipados: {str(e)}")
-
-def remove_empty_folders(submissions_folder):
-    try:
-        for student_folder in os.listdir(submissions_folder):
-            folder_path = os.path.join(submissions_folder, student_folder)
-            if os.path.isdir(folder_path) and not os.listdir(folder_path):
-                os.rmdir(folder_path)
-    except Exception as e:
-        log_error(f"Erro ao remover pastas vazias: {str(e)}")
@@ -4,6 +4,8 @@ from google.oauth2.credentials import Credentials
 from utils.utils import log_error, log_info
 from infrastructure.auth_google import get_gspread_client
 from infrastructure.auth_google import get_credentials
+from infrastructure.api_executor import call_with_retry, execute
+from utils.metrics import increment, timed
 
 def create_or_get_google_sheet_in_folder(classroom_name, list_name, folder_id):
     try:
@@ -11,33 +13,33 @@ def create_or_get_google_sheet_in_folder(classroom_name, list_name, folder_id):
         drive_service = build("drive", "v3", credentials=get_credentials())
 
         query = f"'{folder_id}' in parents and mimeType='application/vnd.google-apps.spreadsheet' and name='{classroom_name}' and trashed=false"
-        response = drive_service.files().list(q=query, spaces='drive', fields='files(id, name)').execute()
+        response = execute(drive_service.files().list(q=query, spaces='drive', fields='files(id, name)'), "drive")
 
         if response['files']:
             spreadsheet_id = response['files'][0]['id']
-            spreadsheet = client.open_by_key(spreadsheet_id)
+            spreadsheet = call_with_retry("sheets", client.open_by_key, spreadsheet_id)
             print(f"Planilha '{classroom_name}' já existe.\n")
 
             try:
-                worksheet = spreadsheet.worksheet(list_name)
+                worksheet = call_with_retry("sheets", spreadsheet.worksheet, list_name)
                 print(f"A aba '{list_name}' já existe na planilha.\n")
                 worksheet = None
                 return worksheet
             except Exception:
 
-                worksheet = spreadsheet.add_worksheet(title=list_name, rows=100, cols=20)
+                worksheet = call_with_retry("sheets", spreadsheet.add_worksheet, title=list_name, rows=100, cols=20)
                 print(f"A aba '{list_name}' foi criada na planilha '{classroom_name}'.\n")
             
             return worksheet
         else:
-            spreadsheet = client.create(classroom_name)
+            spreadsheet = call_with_retry("sheets", client.create, classroom_name)
             print(f"Planilha '{classroom_name}' criada com sucesso.\n")
 
             file_id = spreadsheet.id
-            drive_service.files().update(fileId=file_id, addParents=folder_id, removeParents='root').execute()
+            execute(drive_service.files().update(fileId=file_id, addParents=folder_id, removeParents='root'), "drive")
 
-            worksheet = spreadsheet.get_worksheet(0)
-            worksheet.update_title(list_name)
+            worksheet = call_with_retry("sheets", spreadsheet.get_worksheet, 0)
+            call_with_retry("sheets", worksheet.update_title, list_name)
             
             return worksheet
 
@@ -49,13 +51,13 @@ def header_worksheet(worksheet, num_questions, score):
         question_headers = [f"QUESTÃO {i + 1}" for i in range(num_questions)]
         header = [['NOME DO ALUNO', 'EMAIL', 'STUDENT LOGIN'] + question_headers +
                   ['ENTREGA?', 'ATRASO?', 'FORMATAÇÃO?', 'CÓPIA?', 'NOTA TOTAL', 'COMENTÁRIOS']]
-        if not worksheet.get_all_values():
-            worksheet.append_rows(header, table_range='A1')
+        if not call_with_retry("sheets", worksheet.get_all_values):
+            call_with_retry("sheets", worksheet.append_rows, header, table_range='A1')
 
         score_row = [''] * 3
         score_row += [score.get(f'q{i + 1}', '') for i in range(num_questions)]
         score_row += [''] * 6
-        worksheet.insert_row(score_row, index=2)
+        call_with_retry("sheets", worksheet.insert_row, score_row, index=2)
 
         log_info("Cabeçalho e linha de score adicionados com sucesso.")
     except Exception as e:
@@ -64,11 +66,11 @@ def header_worksheet(worksheet, num_questions, score):
 def insert_header_title(worksheet, classroom_name, list_title):
     try:
         title = f"{classroom_name} - {list_title}"
-        worksheet.insert_row([title], index=1)
+        call_with_retry("sheets", worksheet.insert_row, [title], index=1)
 
         sheet_id = worksheet.id
         spreadsheet = worksheet.spreadsheet
-        spreadsheet.batch_update({
+        call_with_retry("sheets", spreadsheet.batch_update, {
             "requests": [
                 {
                     "repeatCell": {
@@ -115,7 +117,7 @@ def insert_header_title(worksheet, classroom_name, list_title):
 def freeze_and_sort(worksheet):
     try:
         spreadsheet = worksheet.spreadsheet
-        spreadsheet.batch_update({
+        call_with_retry("sheets", spreadsheet.batch_update, {
             "requests": [
                 {
                     "updateSheetProperties": {
@@ -150,7 +152,7 @@ def freeze_and_sort(worksheet):
 
 def apply_dynamic_formula_in_column(worksheet, num_questions):
     try:
-        data = worksheet.get_all_values()
+        data = call_with_retry("sheets", worksheet.get_all_values)
         requests = []
 
         last_filled_row = 0
@@ -192,11 +194,12 @@ def apply_dynamic_formula_in_column(worksheet, num_questions):
         body = {
             'requests': requests
         }
-        worksheet.spreadsheet.batch_update(body)
+        call_with_retry("sheets", worksheet.spreadsheet.batch_update, body)
 
     except Exception as e:
         log_error(f"Erro ao aplicar formula dinâmica: {e}")
 
+@timed("fill_worksheet_with_students")
 def fill_worksheet_with_students(worksheet, students, num_questions):
     try:
         if not students:
@@ -204,7 +207,8 @@ def fill_worksheet_with_students(worksheet, students, num_questions):
             return
 
         rows = [student.to_list(num_questions) for student in students]
-        worksheet.append_rows(rows)
+        call_with_retry("sheets", worksheet.append_rows, rows)
+        increment("spreadsheet_rows_total", len(rows))
         log_info(f"{len(rows)} alunos inseridos na planilha com sucesso.")
     except Exception as e:
         log_error(f"Erro ao preencher a planilha com alunos: {e}")
@@ -2,10 +2,26 @@ import io
 import os
 import shutil
 import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
 from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseDownload
 from core.models.student_submission import StudentSubmission
-from utils.utils import extract_prefix, get_submission_timestamp, calculate_delay, get_due_date, log_info, log_error
+from core.models.student_registry import StudentRegistry
+from core.models.download_manifest import AttachmentRecord
+from infrastructure.api_executor import call_with_retry, execute
+from infrastructure.archive_backends import detect_backend
+from infrastructure.auth_google import get_thread_http
+from infrastructure.batch_gateway import execute_batch
+from infrastructure.classroom_gateway import load_course_roster, get_due_date
+from utils.utils import extract_prefix, get_submission_timestamp, calculate_delay, log_info, log_error, log_debug
+from utils.log_writer import log_context
+from utils.metrics import increment, timed
+
+DEFAULT_DOWNLOAD_WORKERS = 8
+ATTACHMENT_FIELDS = "id,name,modifiedTime,md5Checksum"
+# Quantidade de submissões cujos metadados são buscados juntos, em lote
+SUBMISSIONS_CHUNK_SIZE = 50
 
 def create_student_folder_if_needed(download_folder, student_login):
     student_folder = os.path.join(download_folder, student_login)
@@ -16,54 +32,93 @@ def rename_file_if_needed(file_name, student_folder, student_obj):
     student_login = student_obj.login
     file_path = os.path.join(student_folder, file_name)
 
-    if file_name.endswith('.zip'):
-        expected_name = f"{student_login}.zip"
+    # O formato é reconhecido pela assinatura do arquivo, e o nome final usa a extensão do formato
+    backend = detect_backend(file_path, file_name)
+    if backend is None:
+        return file_path
+
+    expected_name = f"{student_login}{backend.extension}"
+    if backend.name == 'zip':
         if file_name != expected_name:
             student_obj.update_field('formatacao', 0)
             student_obj.add_comment(f"Erro de submissão. Nome do zip incorreto: {file_name}.")
             corrected_path = os.path.join(student_folder, expected_name)
             shutil.move(file_path, corrected_path)
+            return corrected_path
 
-    elif file_name.endswith('.rar'):
+    else:
         student_obj.update_field('formatacao', 0)
-        student_obj.add_comment(f"Erro de submissão. Enviou .rar ({file_name}) ao invés de .zip.")
-        expected_name = f"{student_login}.rar"
+        student_obj.add_comment(f"Erro de submissão. Enviou .{backend.name} ({file_name}) ao invés de .zip.")
         if file_name != expected_name:
             corrected_path = os.path.join(student_folder, expected_name)
             shutil.move(file_path, corrected_path)
             student_obj.add_comment(f"Renomeado {file_name} para {expected_name}.")
+            return corrected_path
+
+    return file_path
+
+def download_file(drive_service, file_id, fh, label, http=None):
+    request = drive_service.files().get_media(fileId=file_id)
+    if http is not None:
+        request.http = http
+
+    downloader = MediaIoBaseDownload(fh, request)
+    done = False
+    progress_percentage = 0
+    while not done:
+        status, done = call_with_retry("drive", downloader.next_chunk)
+        progress_percentage = int(status.progress() * 100)
+        log_debug(f"Baixando {label}: {progress_percentage}%")
+    increment("download_bytes_total", status.resumable_progress)
+    return progress_percentage
 
-def handle_attachment(file_id, file_name, student_folder, student_obj, drive_service):
+@timed("handle_attachment")
+def handle_attachment(file_id, file_name, student_folder, student_obj, drive_service, http=None,
+                      md5_checksum='', blob_store=None):
+    writer = None
     try:
         file_path = os.path.join(student_folder, file_name)
-        request = drive_service.files().get_media(fileId=file_id)
-        with io.FileIO(file_path, 'wb') as fh:
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            progress_percentage = 0
-            while not done:
-                status, done = downloader.next_chunk()
-                progress_percentage = int(status.progress() * 100)
-                log_info(f"Baixando {file_name} de {student_obj.name}: {progress_percentage}%")
+        label = f"{file_name} de {student_obj.name}"
+
+        if blob_store is None:
+            with io.FileIO(file_path, 'wb') as fh:
+                progress_percentage = download_file(drive_service, file_id, fh, label, http)
+        elif blob_store.has(md5_checksum):
+            log_info(f"O arquivo {label} já está no armazenamento local, download ignorado.")
+            increment("download_cache_hits_total")
+            blob_store.link_into(md5_checksum, file_path)
+            progress_percentage = 100
+        else:
+            # O md5 é calculado durante o download e conferido com o do Drive antes de o arquivo entrar no armazenamento
+            with blob_store.open_writer() as writer:
+                progress_percentage = download_file(drive_service, file_id, writer, label, http)
+
+            if progress_percentage > 0:
+                digest = blob_store.commit(writer, md5_checksum)
+                if digest is None:
+                    student_obj.update_field('entregou', 0)
+                    student_obj.add_comment(f"Erro de submissão: o arquivo {file_name} foi baixado corrompido.")
+                    return None
+                blob_store.link_into(digest, file_path)
 
         if progress_percentage == 0:
             student_obj.update_field('entregou', 0)
             student_obj.add_comment("Erro de submissão ou submissão não foi baixada.")
             if os.path.exists(file_path):
                 os.remove(file_path)
-            return
+            return None
 
         raw_code_extensions = ['.c', '.cpp', '.py', '.java', '.js', '.rb', '.hs']
         if any(file_name.endswith(ext) for ext in raw_code_extensions):
             student_obj.update_field('entregou', 1)
             student_obj.add_comment("Erro de submissão: enviou arquivo(s), mas não enviou numa pasta compactada.")
 
-            student_folder = create_student_folder_if_needed(download_folder, student_login)
-            new_path = os.path.join(student_folder, file_name)
+            raw_folder = create_student_folder_if_needed(student_folder, student_obj.login)
+            new_path = os.path.join(raw_folder, file_name)
             shutil.move(file_path, new_path)
-            file_path = new_path 
+            return new_path
 
-        rename_file_if_needed(file_name, student_folder, student_obj)
+        return rename_file_if_needed(file_name, student_folder, student_obj)
 
     except HttpError as error:
         if error.resp.status == 403 and 'cannotDownloadAbusiveFile' in str(error):
@@ -76,64 +131,191 @@ def handle_attachment(file_id, file_name, student_folder, student_obj, drive_ser
             student_obj.update_field('entregou', 0)
             student_obj.add_comment(f"Erro de submissão: erro ao baixar arquivo {file_name}.")
             log_info(f"Erro ao baixar arquivo {file_name} de {student_obj.name}: {error}")
+        return None
+    finally:
+        # O arquivo temporário só sobra se o download não chegou ao commit (que o move para o armazenamento),
+        # seja qual for o erro
+        if writer is not None:
+            blob_store.discard(writer)
+
+def build_attachment_record(attachment, metadata=None):
+    metadata = metadata or {}
+    return AttachmentRecord(
+        file_id=attachment.get('driveFile', {}).get('id'),
+        title=attachment.get('driveFile', {}).get('title'),
+        modified_time=metadata.get('modifiedTime', ''),
+        md5_checksum=metadata.get('md5Checksum', '')
+    )
+
+# Busca em lote os metadados no Drive de todos os anexos de um bloco de submissões
+def prefetch_attachment_metadata(drive_service, submissions):
+    requests = {}
+    for submission in submissions:
+        for attachment in submission.get('assignmentSubmission', {}).get('attachments', []):
+            file_id = attachment.get('driveFile', {}).get('id')
+            if file_id and file_id not in requests:
+                requests[file_id] = drive_service.files().get(fileId=file_id, fields=ATTACHMENT_FIELDS)
+
+    results, errors = execute_batch(drive_service, "drive", requests)
+    for file_id, error in errors.items():
+        log_info(f"Não foi possível obter os metadados do arquivo {file_id}: {error}")
+    return results
+
+# Busca em lote os perfis dos alunos de um bloco de submissões que não estão no índice da turma
+def prefetch_missing_profiles(classroom_service, classroom_id, submissions, roster):
+    requests = {}
+    for submission in submissions:
+        student_id = submission.get('userId')
+        if student_id and student_id not in roster and student_id not in requests:
+            requests[student_id] = classroom_service.courses().students().get(courseId=classroom_id, userId=student_id)
+
+    if not requests:
+        return
+
+    log_info(f"{len(requests)} alunos não estão no índice da turma, buscando em lote.")
+    results, errors = execute_batch(classroom_service, "classroom", requests)
+    for student_id, student in results.items():
+        roster[student_id] = student['profile']
+    for student_id, error in errors.items():
+        log_info(f"Não foi possível obter o perfil do aluno {student_id}: {error}")
+
+# previous_students são os alunos da execução anterior (snapshot com o diário reaplicado), de onde vem o aluno
+# reaproveitado quando os anexos não mudaram
+def download_student_attachments(attachments, download_folder, student_obj, drive_service, creds=None,
+                                 manifest=None, user_id='', records=None, blob_store=None, previous_students=None):
+    # Os anexos de um mesmo aluno são baixados em sequência pelo mesmo worker,
+    # assim os comentários do aluno ficam sempre na mesma ordem
+    with log_context(stage="download", login=student_obj.login):
+        try:
+            http = get_thread_http(creds) if creds is not None else None
+            if records is None:
+                records = [build_attachment_record(attachment) for attachment in attachments]
+
+            if manifest is not None:
+                previous_student = previous_students.get(student_obj.login) if previous_students is not None else None
+                if previous_student is not None and manifest.can_reuse(student_obj.login, records, download_folder):
+                    log_info(f"Anexos de {student_obj.login} não mudaram desde a última execução, download ignorado.")
+                    # Arquivos de alunos antigos não guardavam o userId
+                    previous_student.user_id = previous_student.user_id or user_id
+                    return previous_student
+                manifest.discard_downloads(student_obj.login, download_folder)
 
-def download_submissions(classroom_service, drive_service, submissions, download_folder, classroom_id, coursework_id):
+            paths = []
+            for record in records:
+                paths.append(handle_attachment(
+                    record.file_id, record.title, download_folder, student_obj, drive_service, http,
+                    record.md5_checksum, blob_store
+                ))
+
+            if manifest is not None:
+                for record, path in zip(records, paths):
+                    record.path = path or ''
+                manifest.record_download(student_obj.login, user_id, records, download_folder)
+
+        except Exception as e:
+            log_error(f"Erro ao baixar anexos de {student_obj.login}: {e}")
+            student_obj.update_field('entregou', 0)
+            student_obj.add_comment("Erro ao processar submissão.")
+
+    return student_obj
+
+def get_student_profile(classroom_service, classroom_id, student_id, roster=None):
+    profile = roster.get(student_id) if roster else None
+    if profile is None:
+        log_info(f"Aluno {student_id} não está no índice da turma, buscando individualmente.")
+        student = execute(classroom_service.courses().students().get(courseId=classroom_id, userId=student_id), "classroom")
+        profile = student['profile']
+        if roster is not None:
+            roster[student_id] = profile
+    return profile
+
+def build_student_submission(classroom_service, submission, classroom_id, due_date, roster=None):
+    student_id = submission['userId']
+    profile = get_student_profile(classroom_service, classroom_id, student_id, roster)
+    student_email = profile['emailAddress']
+    student_login = extract_prefix(student_email)
+    student_name = profile['name']['fullName']
+
+    with log_context(login=student_login):
+        state = submission.get('state', 'UNKNOWN')
+
+        log_info(f"\nHistórico de submissão: {submission.get('submissionHistory', [])}")
+        submission_date = get_submission_timestamp(submission, student_id)
+        attachments = submission.get('assignmentSubmission', {}).get('attachments', [])
+        log_info(f"Due date: {due_date}, Submission date: {submission_date}, State: {state}")
+
+        student_obj = StudentSubmission(
+            name=student_name,
+            email=student_email,
+            login=student_login,
+            entregou=1,
+            atrasou=0,
+            formatacao=1,
+            copia=0,
+            user_id=student_id
+        )
+
+        if not attachments:
+            student_obj.update_field('entregou', 0)
+            student_obj.add_comment("Erro de submissão. Não entregou a atividade.")
+            log_info(f"{student_name} Aluno não entregou submissão.")
+        elif due_date and submission_date:
+            student_obj.update_field('atrasou', calculate_delay(due_date, submission_date))
+
+    return student_obj, attachments
+
+def iter_chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# Com max_workers=0 os anexos são baixados na própria thread da chamada (usado pelo --profile)
+@timed("download_submissions")
+def download_submissions(classroom_service, drive_service, submissions, download_folder, classroom_id, coursework_id,
+                         max_workers=DEFAULT_DOWNLOAD_WORKERS, creds=None, manifest=None, due_date=None,
+                         blob_store=None, previous_students=None):
     try:
-        students = []
-        due_date = get_due_date(classroom_service, classroom_id, coursework_id)
-
-        for submission in submissions.get('studentSubmissions', []):
-            try:
-                student_id = submission['userId']
-                student = classroom_service.courses().students().get(courseId=classroom_id, userId=student_id).execute()
-                student_email = student['profile']['emailAddress']
-                student_login = extract_prefix(student_email)
-                student_name = student['profile']['name']['fullName']
-
-                entregou = 1
-                atrasou = 0
-                formatacao = 1
-                copia = 0
-                state = submission.get('state', 'UNKNOWN')
-
-                log_info(f"\nHistórico de submissão: {submission.get('submissionHistory', [])}")
-                submission_date = get_submission_timestamp(submission, student_id)
-                attachments = submission.get('assignmentSubmission', {}).get('attachments', [])
-                log_info(f"Due date: {due_date}, Submission date: {submission_date}, State: {state}")
-
-                student_obj = StudentSubmission(
-                    name=student_name,
-                    email=student_email,
-                    login=student_login,
-                    entregou=entregou,
-                    atrasou=atrasou,
-                    formatacao=formatacao,
-                    copia=copia
-                )
-
-                if not attachments:
-                    student_obj.update_field('entregou', 0)
-                    student_obj.add_comment("Erro de submissão. Não entregou a atividade.")
-                    log_info(f"{student_name} Aluno não entregou submissão.")
-                else:
-                    if due_date and submission_date:
-                        student_obj.update_field('atrasou', calculate_delay(due_date, submission_date))
+        students = StudentRegistry()
+        if due_date is None:
+            due_date = get_due_date(classroom_service, classroom_id, coursework_id)
+        roster = load_course_roster(classroom_service, classroom_id)
+
+        with ThreadPoolExecutor(max_workers=max_workers) if max_workers > 0 else nullcontext() as executor:
+            results = []
+
+            for chunk in iter_chunks(submissions, SUBMISSIONS_CHUNK_SIZE):
+                prefetch_missing_profiles(classroom_service, classroom_id, chunk, roster)
+                metadata = prefetch_attachment_metadata(drive_service, chunk)
 
-                    for attachment in attachments:
-                        file_id = attachment.get('driveFile', {}).get('id')
-                        file_name = attachment.get('driveFile', {}).get('title')
-                        handle_attachment(file_id, file_name, download_folder, student_obj, drive_service)
+                for submission in chunk:
+                    try:
+                        student_obj, attachments = build_student_submission(classroom_service, submission, classroom_id, due_date, roster)
+                    except Exception as e:
+                        log_error(f"Erro ao processar submissão de aluno {submission.get('userId')}: {e}")
+                        continue
 
-            except Exception as e:
-                log_error(f"Erro ao processar submissão de aluno: {e}")
-                student_obj.update_field('entregou', 0)
-                student_obj.add_comment("Erro ao processar submissão.")
-                log_info(f"Nenhum anexo encontrado para {student_name}")
+                    if attachments:
+                        records = [
+                            build_attachment_record(a, metadata.get(a.get('driveFile', {}).get('id'))) for a in attachments
+                        ]
+                        args = (attachments, download_folder, student_obj, drive_service, creds,
+                                manifest, submission['userId'], records, blob_store, previous_students)
+                        if executor is None:
+                            results.append(download_student_attachments(*args))
+                        else:
+                            results.append(executor.submit(download_student_attachments, *args))
+                    else:
+                        results.append(student_obj)
 
-            students.append(student_obj)
+            students = StudentRegistry(r.result() if isinstance(r, Future) else r for r in results)
 
         return students
 
     except Exception as e:
         log_error(f"Erro geral ao baixar submissões: {e}")
-        return []
+        return StudentRegistry()
@@ -0,0 +1,153 @@
+import os
+import re
+import zlib
+from collections import defaultdict
+from services.language_rules import rules_for_title
+from utils.utils import log_error, log_info
+
+# Tamanho dos k-gramas de tokens e da janela do winnowing
+K_GRAM = 5
+WINDOW = 4
+# Fração mínima das impressões digitais do menor arquivo que precisa aparecer no outro para indicar cópia
+SIMILARITY_THRESHOLD = 0.8
+MIN_SHARED_FINGERPRINTS = 8
+# Impressões presentes em mais que essa fração dos arquivos de uma questão são código comum (esqueleto, main, includes).
+# O filtro só vale a partir de COMMON_FINGERPRINT_MIN_FILES arquivos: numa turma pequena, um grupo de cópias
+# idênticas também passaria da fração.
+COMMON_FINGERPRINT_RATIO = 0.5
+COMMON_FINGERPRINT_MIN_FILES = 20
+
+C_COMMENTS = re.compile(r"//[^\n]*|/\*.*?\*/|^\s*#[^\n]*", re.S | re.M)
+HS_COMMENTS = re.compile(r"--[^\n]*|\{-.*?-\}", re.S)
+TOKEN_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])\'|[A-Za-z_][A-Za-z0-9_\']*|\d+(?:\.\d+)?|\S')
+
+C_KEYWORDS = {
+    "auto", "break", "case", "char", "const", "continue", "default", "do", "double", "else", "enum", "extern",
+    "float", "for", "goto", "if", "int", "long", "register", "return", "short", "signed", "sizeof", "static",
+    "struct", "switch", "typedef", "union", "unsigned", "void", "volatile", "while", "main", "printf", "scanf",
+    "malloc", "free", "NULL",
+}
+HS_KEYWORDS = {
+    "case", "class", "data", "deriving", "do", "else", "if", "import", "in", "instance", "let", "module", "newtype",
+    "of", "then", "type", "where", "main", "putStrLn", "print", "show", "read", "getLine", "map", "filter", "foldr",
+    "foldl", "Int", "Integer", "Bool", "String", "Char", "Float", "Double", "True", "False", "Maybe", "Just", "Nothing",
+}
+
+# Tokenizadores por extensão de arquivo de questão (LanguageRules.extension); linguagens fora daqui não são verificadas
+LANGUAGES = {
+    ".c": (C_COMMENTS, C_KEYWORDS),
+    ".hs": (HS_COMMENTS, HS_KEYWORDS),
+}
+
+QUESTION_FILE_RE = re.compile(r"^q(\d+)_(.+)(\.\w+)$")
+
+def tokenize(source, extension):
+    comments, keywords = LANGUAGES[extension]
+    tokens = []
+    for token in TOKEN_RE.findall(comments.sub(" ", source)):
+        if token[0] in "\"'":
+            tokens.append("S")
+        elif token[0].isdigit():
+            tokens.append("N")
+        elif token[0].isalpha() or token[0] == "_":
+            tokens.append(token if token in keywords else "V")
+        else:
+            tokens.append(token)
+    return tokens
+
+def winnow(tokens, k=K_GRAM, window=WINDOW):
+    hashes = [zlib.crc32("\x1f".join(tokens[i:i + k]).encode()) for i in range(len(tokens) - k + 1)]
+    if len(hashes) <= window:
+        return set(hashes)
+
+    fingerprints = set()
+    for i in range(len(hashes) - window + 1):
+        fingerprints.add(min(hashes[i:i + window]))
+    return fingerprints
+
+def fingerprint_file(path):
+    try:
+        extension = os.path.splitext(path)[1]
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            return path, winnow(tokenize(f.read(), extension))
+    except Exception as e:
+        log_error(f"Erro ao gerar impressões digitais de {path}: {e}")
+        return path, set()
+
+def collect_question_files(submissions_folder, students, extension):
+    files = []
+    for student in students:
+        student_folder = os.path.join(submissions_folder, student.login)
+        if not os.path.isdir(student_folder):
+            continue
+        for entry in os.scandir(student_folder):
+            match = QUESTION_FILE_RE.match(entry.name)
+            if entry.is_file() and match and match.group(2) == student.login and match.group(3) == extension:
+                files.append((int(match.group(1)), student.login, entry.path))
+    return files
+
+def find_similar_pairs(fingerprints_by_login):
+    # Índice invertido impressão -> alunos: só são comparados pares que compartilham alguma impressão
+    index = defaultdict(list)
+    for login, fingerprints in fingerprints_by_login.items():
+        for fingerprint in fingerprints:
+            index[fingerprint].append(login)
+
+    max_holders = len(fingerprints_by_login)
+    if max_holders >= COMMON_FINGERPRINT_MIN_FILES:
+        max_holders = int(max_holders * COMMON_FINGERPRINT_RATIO)
+    shared = defaultdict(int)
+    for logins in index.values():
+        if len(logins) < 2 or len(logins) > max_holders:
+            continue
+        for i in range(len(logins)):
+            for j in range(i + 1, len(logins)):
+                shared[(logins[i], logins[j])] += 1
+
+    pairs = []
+    for (login_a, login_b), count in shared.items():
+        smallest = min(len(fingerprints_by_login[login_a]), len(fingerprints_by_login[login_b]))
+        if count >= MIN_SHARED_FINGERPRINTS and count / smallest >= SIMILARITY_THRESHOLD:
+            pairs.append((login_a, login_b, count / smallest))
+    return pairs
+
+# Com um executor de processos (ex: o pool spawn de create_extraction_pool) as impressões digitais são calculadas em
+# paralelo; sem executor, no próprio processo
+def detect_copies(submissions_folder, students, list_title, executor=None):
+    try:
+        rules = rules_for_title(list_title)
+        if rules.extension not in LANGUAGES:
+            log_info(f"Verificação de cópias não disponível para {rules.name}, etapa ignorada.")
+            return
+
+        files = collect_question_files(submissions_folder, students, rules.extension)
+        if not files:
+            log_info("Nenhum arquivo de questão encontrado para verificar cópias.")
+            return
+
+        paths = [path for _, _, path in files]
+        if executor is None:
+            fingerprints = dict(map(fingerprint_file, paths))
+        else:
+            fingerprints = dict(executor.map(fingerprint_file, paths, chunksize=16))
+
+        by_question = defaultdict(dict)
+        for question, login, path in files:
+            by_question[question][login] = fingerprints[path]
+
+        matches = defaultdict(lambda: defaultdict(set))
+        for question, fingerprints_by_login in by_question.items():
+            for login_a, login_b, similarity in find_similar_pairs(fingerprints_by_login):
+                log_info(f"Possível cópia na questão {question}: {login_a} e {login_b} ({similarity:.0%})")
+                matches[login_a][question].add(login_b)
+                matches[login_b][question].add(login_a)
+
+        for student in students:
+            for question, logins in sorted(matches.get(student.login, {}).items()):
+                student.update_field('copia', 1)
+                student.add_comment(f"Possível cópia na questão {question} com: {', '.join(sorted(logins))}.")
+
+        log_info(f"Verificação de cópias finalizada: {len(matches)} alunos com possível cópia.")
+
+    except Exception as e:
+        log_error(f"Erro ao verificar cópias: {e}")
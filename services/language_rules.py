@@ -0,0 +1,34 @@
+from dataclasses import dataclass
+
+# Nomes de executáveis e de arquivos de build que os alunos enviam junto com o código
+BUILD_NAMES = ('makefile', 'main', 'main-debug')
+
+@dataclass(frozen=True)
+class LanguageRules:
+    # Regras de limpeza e renomeação dos arquivos de uma linguagem:
+    # - title_keyword: palavra no título da lista que seleciona a linguagem (None para a linguagem padrão);
+    # - extension: extensão dos arquivos de questão; variações de caixa (ex: .C) são corrigidas para ela;
+    # - converted_extensions: extensões renomeadas para extension (ex: .cpp numa lista de C);
+    # - banned_names: nomes (sem extensão, em minúsculas) de arquivos apagados da pasta do aluno.
+    name: str
+    title_keyword: str
+    extension: str
+    converted_extensions: tuple = ()
+    banned_names: tuple = ()
+
+    def question_filename(self, question_number, student_login):
+        return f"q{question_number}_{student_login}{self.extension}"
+
+# Em ordem de prioridade; a última é a padrão, usada quando nenhuma palavra-chave aparece no título
+LANGUAGE_RULES = [
+    LanguageRules('haskell', 'HASKELL', '.hs', banned_names=BUILD_NAMES),
+    LanguageRules('python', 'PYTHON', '.py'),
+    LanguageRules('java', 'JAVA', '.java'),
+    LanguageRules('c', None, '.c', converted_extensions=('.cpp',), banned_names=BUILD_NAMES),
+]
+
+def rules_for_title(list_title):
+    return next(
+        (rules for rules in LANGUAGE_RULES if rules.title_keyword is None or rules.title_keyword in list_title),
+        LANGUAGE_RULES[-1]
+    )
@@ -0,0 +1,120 @@
+import re
+from collections import defaultdict
+
+# Sufixo de cópia que o sistema operacional adiciona ao baixar o mesmo arquivo de novo, ex: "q1 (1).c"
+COPY_SUFFIX = re.compile(r"\(\d+\)")
+NUMBER = re.compile(r"\d+")
+# Similaridade mínima (coeficiente de Dice entre os trigramas) para a correspondência aproximada
+FUZZY_THRESHOLD = 0.6
+# Nomes maiores que isso não são comparados por trigramas: não são nomes de questão e só encareceriam a busca
+FUZZY_MAX_NAME_LENGTH = 48
+NUMBER_WORDS = {
+    'um': '1', 'uma': '1', 'dois': '2', 'duas': '2', 'tres': '3', 'três': '3', 'quatro': '4', 'cinco': '5',
+    'seis': '6', 'sete': '7', 'oito': '8', 'nove': '9', 'dez': '10',
+}
+
+def normalize_alias(alias):
+    return alias.lower().strip()
+
+def normalize_filename(base_name, student_login):
+    return COPY_SUFFIX.sub("", base_name.lower()).replace("_", " ").replace(student_login.lower(), "").strip()
+
+def number_words_to_digits(name):
+    return " ".join(NUMBER_WORDS.get(token, token) for token in name.split())
+
+# Números de um nome, sem zeros à esquerda: são eles que distinguem uma questão da outra ("questao1" e "questao2")
+def name_numbers(name):
+    return tuple(int(number) for number in NUMBER.findall(name))
+
+def trigrams(name):
+    padded = f"  {name.replace(' ', '')} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class QuestionMatcher:
+    # Índices dos nomes possíveis de cada questão (saída de list_questions), montados uma vez por lista e
+    # reaproveitados para todos os alunos de todas as turmas:
+    # - exact_index: nome normalizado -> questões, para a correspondência exata;
+    # - token_index: palavra de um nome -> questões, para a parcial (a palavra aparece em qualquer lugar do nome do arquivo);
+    # - trigram_index: trigrama -> nomes que o contêm, para a aproximada (erros de digitação, ex: "qustao").
+    # As questões de cada entrada ficam em ordem crescente: num empate vence a menor questão ainda não usada pelo aluno.
+    def __init__(self, questions_data):
+        self.questions = sorted(questions_data)
+        self.exact_index = defaultdict(list)
+        self.token_index = defaultdict(list)
+        self.trigram_index = defaultdict(list)
+        self.alias_questions = []
+        self.alias_trigram_counts = []
+        self.alias_numbers = []
+
+        for question in self.questions:
+            for alias in questions_data[question]:
+                name = normalize_alias(alias)
+                if question not in self.exact_index[name]:
+                    self.exact_index[name].append(question)
+                for token in name.split():
+                    if question not in self.token_index[token]:
+                        self.token_index[token].append(question)
+
+                alias_id = len(self.alias_questions)
+                alias_trigrams = trigrams(name)
+                self.alias_questions.append(question)
+                self.alias_trigram_counts.append(len(alias_trigrams))
+                self.alias_numbers.append(name_numbers(name))
+                for gram in alias_trigrams:
+                    self.trigram_index[gram].append(alias_id)
+
+        self.token_lengths = sorted({len(token) for token in self.token_index})
+
+    def first_unused(self, questions, used_questions):
+        return next((question for question in questions if question not in used_questions), None)
+
+    def match_exact(self, name, used_questions):
+        return self.first_unused(self.exact_index.get(name, ()), used_questions)
+
+    # Procura no índice cada trecho do nome com o tamanho de alguma palavra conhecida, em vez de testar todos os nomes
+    def match_partial(self, name, used_questions):
+        candidates = set()
+        for length in self.token_lengths:
+            if length > len(name):
+                break
+            for start in range(len(name) - length + 1):
+                questions = self.token_index.get(name[start:start + length])
+                if questions:
+                    candidates.update(questions)
+        return self.first_unused(sorted(candidates), used_questions)
+
+    # Último recurso antes da revisão manual. Números por extenso viram dígitos e passam de novo pelas correspondências
+    # exata e parcial (ex: "exercicio um"). Depois, os nomes que compartilham trigramas com o nome do arquivo são
+    # pontuados pelo coeficiente de Dice. Só os nomes das listas de trigramas do arquivo são visitados, sem percorrer
+    # todos os nomes, e só os que têm os mesmos números que o arquivo: os trigramas quase não enxergam a diferença
+    # entre "questao1" e "questao2". Vence a maior similaridade acima de FUZZY_THRESHOLD; no empate, a menor questão.
+    def match_fuzzy(self, name, used_questions):
+        converted = number_words_to_digits(name)
+        if converted != name:
+            question = self.match_exact(converted, used_questions)
+            if question is None:
+                question = self.match_partial(converted, used_questions)
+            if question is not None:
+                return question
+
+        if not name or len(name) > FUZZY_MAX_NAME_LENGTH:
+            return None
+
+        name_trigrams = trigrams(name)
+        numbers = name_numbers(converted)
+        shared = defaultdict(int)
+        for gram in name_trigrams:
+            for alias_id in self.trigram_index.get(gram, ()):
+                shared[alias_id] += 1
+
+        best_question, best_score = None, 0.0
+        for alias_id, count in shared.items():
+            question = self.alias_questions[alias_id]
+            if question in used_questions or self.alias_numbers[alias_id] != numbers:
+                continue
+            score = 2 * count / (len(name_trigrams) + self.alias_trigram_counts[alias_id])
+            if score < FUZZY_THRESHOLD:
+                continue
+            if score > best_score or (score == best_score and question < best_question):
+                best_question, best_score = question, score
+        return best_question
@@ -0,0 +1,23 @@
+import pytest
+from core.models.student_submission import StudentSubmission
+from utils import log_writer
+
+# Os logs do código testado vão para uma pasta temporária, e não para o output/ do repositório
+@pytest.fixture(autouse=True)
+def log_folder(tmp_path_factory, monkeypatch):
+    folder = str(tmp_path_factory.mktemp("logs"))
+    log_writer.close_writer()
+    monkeypatch.setenv("LOG_FOLDER", folder)
+    monkeypatch.setattr(log_writer, "LOG_FOLDER", folder)
+    yield folder
+    log_writer.close_writer()
+
+# Aluno que entregou no prazo e sem erros; os campos podem ser trocados por parâmetro
+@pytest.fixture
+def make_student():
+    def make(login="alu0001", **fields):
+        data = {"name": "Aluno", "email": f"{login}@cesar.school", "login": login, "entregou": 1, "atrasou": 0,
+                "formatacao": 1, "copia": 0}
+        data.update(fields)
+        return StudentSubmission(**data)
+    return make
@@ -0,0 +1,34 @@
+import io
+import tarfile
+import pytest
+from infrastructure.archive_backends import TarArchive
+from infrastructure.archive_extractor import ArchiveLimitExceeded, ExtractionBudget, ExtractionLimits, build_tree
+
+def write_tar_gz(path, count):
+    with tarfile.open(path, "w:gz") as tar:
+        for number in range(count):
+            info = tarfile.TarInfo(f"alu0001/q{number}_alu0001.c")
+            info.size = 4
+            tar.addfile(info, io.BytesIO(b"int;"))
+
+def test_tar_members_are_checked_as_headers_are_read(tmp_path):
+    path = str(tmp_path / "alu0001.tar.gz")
+    write_tar_gz(path, 50)
+    archive = TarArchive(path, "r:gz")
+
+    with pytest.raises(ArchiveLimitExceeded):
+        build_tree(archive, budget=ExtractionBudget(ExtractionLimits(max_members=10)))
+    # O resto do fluxo não foi lido
+    assert len(archive._entries) == 11
+    archive.close()
+
+def test_tar_members_can_be_listed_again_and_opened(tmp_path):
+    path = str(tmp_path / "alu0001.tar.gz")
+    write_tar_gz(path, 3)
+    archive = TarArchive(path, "r:gz")
+
+    names = [entry.filename for entry in archive.infolist()]
+    assert names == [entry.filename for entry in archive.infolist()] == [f"alu0001/q{n}_alu0001.c" for n in range(3)]
+    with archive.open(archive._entries[1]) as member:
+        assert member.read() == b"int;"
+    archive.close()
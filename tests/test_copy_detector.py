@@ -0,0 +1,62 @@
+import os
+import random
+from services import copy_detector
+
+SOURCE = """
+int soma(int a, int b) {
+    int total = 0;
+    for (int i = a; i <= b; i++) {
+        if (i % 2 == 0) total += i * 3;
+        else total -= i;
+    }
+    return total;
+}
+"""
+
+# Palavras-chave e operadores continuam como estão na tokenização: sequências aleatórias deles dão códigos distintos
+VOCABULARY = sorted(copy_detector.C_KEYWORDS) + list("+-*/%<>=!&|^~?:;,(){}[]")
+
+def distinct_source(seed):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(VOCABULARY) for _ in range(200))
+
+def write_question(folder, login, extension, source=SOURCE):
+    os.makedirs(os.path.join(folder, login), exist_ok=True)
+    with open(os.path.join(folder, login, f"q1_{login}{extension}"), "w", encoding="utf-8") as file:
+        file.write(source)
+
+def test_copies_are_detected_with_the_list_language(tmp_path, make_student):
+    students = [make_student("alu0001"), make_student("alu0002")]
+    for student in students:
+        write_question(tmp_path, student.login, ".c")
+
+    copy_detector.detect_copies(str(tmp_path), students, "LISTA 01")
+    assert [student.copia for student in students] == [1, 1]
+
+def test_languages_without_tokenizer_are_skipped(tmp_path, monkeypatch, make_student):
+    messages = []
+    monkeypatch.setattr(copy_detector, "log_info", messages.append)
+    students = [make_student("alu0001"), make_student("alu0002")]
+    for student in students:
+        write_question(tmp_path, student.login, ".py", SOURCE.replace("int ", ""))
+
+    copy_detector.detect_copies(str(tmp_path), students, "LISTA 01 - PYTHON")
+    assert [student.copia for student in students] == [0, 0]
+    assert messages == ["Verificação de cópias não disponível para python, etapa ignorada."]
+
+def detect_in_class(make_student, tmp_path, copied, total):
+    students = [make_student(f"alu{number:04d}") for number in range(1, total + 1)]
+    for position, student in enumerate(students):
+        write_question(tmp_path, student.login, ".c", SOURCE if position < copied else distinct_source(position))
+
+    copy_detector.detect_copies(str(tmp_path), students, "LISTA 01")
+    return [student.copia for student in students]
+
+def test_copy_ring_is_detected_in_small_classes(tmp_path, make_student):
+    assert detect_in_class(make_student, tmp_path / "a", 3, 3) == [1, 1, 1]
+    assert detect_in_class(make_student, tmp_path / "b", 3, 5) == [1, 1, 1, 0, 0]
+    assert detect_in_class(make_student, tmp_path / "c", 6, 10) == [1] * 6 + [0] * 4
+
+def test_code_shared_by_most_of_a_large_class_is_ignored(tmp_path, make_student):
+    # Em turmas grandes, o que a maioria dos arquivos tem em comum é tratado como esqueleto da questão
+    assert detect_in_class(make_student, tmp_path, 15, 20) == [0] * 20
@@ -0,0 +1,61 @@
+import os
+from core.models.download_manifest import (AttachmentRecord, DownloadManifest, STAGE_DOWNLOADED, STAGE_RENAMED,
+                                           load_manifest_from_json)
+
+def record(path=''):
+    return AttachmentRecord(file_id="file-1", title="alu0001.zip", md5_checksum="abc", path=path)
+
+def test_failed_download_is_not_reused_after_later_stages(tmp_path, make_student):
+    manifest = DownloadManifest(class_name="Turma A", list_name="Lista 01")
+    student = make_student(entregou=0)
+    manifest.record_download(student.login, "user-1", [record('')], str(tmp_path))
+    manifest.set_stage([student], STAGE_RENAMED)
+
+    assert not manifest.can_reuse(student.login, [record()], str(tmp_path))
+
+def test_failed_download_is_not_reused_after_reload(tmp_path, make_student):
+    manifest_path = os.path.join(tmp_path, "manifest.json")
+    manifest = load_manifest_from_json(manifest_path, "Turma A", "Lista 01")
+    student = make_student(entregou=0)
+    manifest.record_download(student.login, "user-1", [record('')], str(tmp_path))
+    manifest.set_stage([student], STAGE_RENAMED)
+    manifest.save()
+
+    reloaded = load_manifest_from_json(manifest_path, "Turma A", "Lista 01")
+    assert not reloaded.can_reuse(student.login, [record()], str(tmp_path))
+
+def test_successful_download_is_reused_after_later_stages(tmp_path, make_student):
+    manifest = DownloadManifest(class_name="Turma A", list_name="Lista 01")
+    student = make_student()
+    # Depois da organização o compactado já saiu da pasta de downloads, e o aluno continua reaproveitável
+    manifest.record_download(student.login, "user-1", [record(os.path.join(tmp_path, "alu0001.zip"))], str(tmp_path))
+    manifest.set_stage([student], STAGE_RENAMED)
+
+    assert manifest.can_reuse(student.login, [record()], str(tmp_path))
+
+def test_downloaded_stage_requires_file_on_disk(tmp_path, make_student):
+    manifest = DownloadManifest(class_name="Turma A", list_name="Lista 01")
+    student = make_student()
+    manifest.record_download(student.login, "user-1", [record(os.path.join(tmp_path, "alu0001.zip"))], str(tmp_path))
+
+    assert manifest.entries[student.login].stage == STAGE_DOWNLOADED
+    assert not manifest.can_reuse(student.login, [record()], str(tmp_path))
+    open(os.path.join(tmp_path, "alu0001.zip"), "wb").close()
+    assert manifest.can_reuse(student.login, [record()], str(tmp_path))
+
+def test_record_download_is_written_only_on_save(tmp_path):
+    manifest_path = os.path.join(tmp_path, "manifest.json")
+    manifest = load_manifest_from_json(manifest_path, "Turma A", "Lista 01")
+    manifest.record_download("alu0001", "user-1", [record(os.path.join(tmp_path, "alu0001.zip"))], str(tmp_path))
+    assert not os.path.exists(manifest_path)
+
+    manifest.save()
+    assert "alu0001" in load_manifest_from_json(manifest_path, "Turma A", "Lista 01").entries
+
+def test_old_manifest_with_student_copy_still_loads(tmp_path):
+    manifest_path = os.path.join(tmp_path, "manifest.json")
+    with open(manifest_path, "w", encoding="utf-8") as file:
+        file.write('{"entries": {"alu0001": {"login": "alu0001", "user_id": "user-1", "stage": "renamed", '
+                   '"attachments": [], "student": {"login": "alu0001"}}}}')
+
+    assert load_manifest_from_json(manifest_path, "Turma A", "Lista 01").stage_of("alu0001") == STAGE_RENAMED
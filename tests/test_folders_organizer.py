@@ -0,0 +1,81 @@
+import io
+import os
+import zipfile
+import pytest
+from infrastructure import archive_extractor
+from infrastructure.archive_extractor import ArchiveLimitExceeded, ExtractionBudget, ExtractionLimits
+from infrastructure.folders_organizer import organize_student_files_worker
+
+CONTENT_SIZE = 300 * 1024
+
+def write_nested_zip(path, login):
+    inner = io.BytesIO()
+    with zipfile.ZipFile(inner, "w", zipfile.ZIP_STORED) as archive:
+        archive.writestr(f"{login}/q1_{login}.c", os.urandom(CONTENT_SIZE))
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+        archive.writestr(f"{login}.zip", inner.getvalue())
+
+def test_nested_archive_bytes_are_counted_once(tmp_path):
+    download_folder = str(tmp_path)
+    submissions_folder = os.path.join(download_folder, "submissions")
+    write_nested_zip(os.path.join(download_folder, "alu0001.zip"), "alu0001")
+
+    # O conteúdo cabe no limite; contando também o zip aninhado e a cópia dele, passaria
+    limits = ExtractionLimits(max_total_size=int(CONTENT_SIZE * 1.5))
+    changes = organize_student_files_worker(download_folder, submissions_folder, "alu0001", "Aluno", limits)
+
+    assert os.path.getsize(os.path.join(submissions_folder, "alu0001", "q1_alu0001.c")) == CONTENT_SIZE
+    assert changes.fields.get("entregou") != 0
+
+def test_nested_archive_content_still_respects_the_limit(tmp_path):
+    download_folder = str(tmp_path)
+    submissions_folder = os.path.join(download_folder, "submissions")
+    write_nested_zip(os.path.join(download_folder, "alu0001.zip"), "alu0001")
+
+    limits = ExtractionLimits(max_total_size=CONTENT_SIZE // 2)
+    organize_student_files_worker(download_folder, submissions_folder, "alu0001", "Aluno", limits)
+
+    assert not os.path.exists(os.path.join(submissions_folder, "alu0001", "q1_alu0001.c"))
+
+def test_limit_message_shows_sizes_under_one_megabyte():
+    budget = ExtractionBudget(ExtractionLimits(max_total_size=512 * 1024))
+    with pytest.raises(ArchiveLimitExceeded, match="conteúdo maior que 0.5 MB"):
+        budget.check_total(600 * 1024)
+
+def test_rejected_nested_archive_discards_formatting_comments(tmp_path, monkeypatch):
+    download_folder = str(tmp_path)
+    submissions_folder = os.path.join(download_folder, "submissions")
+    write_nested_zip(os.path.join(download_folder, "alu0001.zip"), "alu0001")
+
+    # O conteúdo do zip aninhado passa do limite só durante a gravação (ex: um cabeçalho que mente o tamanho)
+    def consume(budget, info, size, member_size):
+        raise ArchiveLimitExceeded("conteúdo maior que 1 MB")
+    monkeypatch.setattr(archive_extractor.ExtractionBudget, "consume", consume)
+    changes = organize_student_files_worker(download_folder, submissions_folder, "alu0001", "Aluno")
+
+    assert changes.fields == {"entregou": 0}
+    assert changes.comments == [
+        "Erro de submissão: compactado rejeitado por exceder o limite de extração (conteúdo maior que 1 MB)."
+    ]
+    assert not os.path.exists(os.path.join(submissions_folder, "alu0001"))
+
+def test_corrupted_member_rolls_back_the_student_folder(tmp_path):
+    download_folder = str(tmp_path)
+    submissions_folder = os.path.join(download_folder, "submissions")
+    archive_path = os.path.join(download_folder, "alu0001.zip")
+    with zipfile.ZipFile(archive_path, "w", zipfile.ZIP_STORED) as archive:
+        archive.writestr("alu0001/q1_alu0001.c", b"int main() { return 0; }\n")
+        archive.writestr("alu0001/q2_alu0001.c", b"int soma(int a, int b) { return a + b; }\n")
+
+    # Troca um byte do conteúdo do segundo membro: o CRC dele deixa de bater na leitura
+    with open(archive_path, "rb") as file:
+        data = bytearray(file.read())
+    data[data.index(b"return a + b")] ^= 0xFF
+    with open(archive_path, "wb") as file:
+        file.write(data)
+
+    changes = organize_student_files_worker(download_folder, submissions_folder, "alu0001", "Aluno")
+
+    assert not os.path.exists(os.path.join(submissions_folder, "alu0001"))
+    assert changes.fields["entregou"] == 0
+    assert f"O arquivo {archive_path} não é um .zip válido." in changes.comments
@@ -0,0 +1,25 @@
+from services.question_matcher import QuestionMatcher
+
+def list_questions(count):
+    return {i: [f'{i}', f'q{i}', f'Q{i}', f'questao{i}', f'questão{i}'] for i in range(1, count + 1)}
+
+def test_fuzzy_does_not_move_duplicate_to_other_question():
+    matcher = QuestionMatcher(list_questions(4))
+    assert matcher.match_fuzzy("questao1", {1}) is None
+
+def test_fuzzy_does_not_match_question_outside_the_list():
+    matcher = QuestionMatcher(list_questions(4))
+    assert matcher.match_fuzzy("questao5", set()) is None
+
+def test_fuzzy_does_not_match_different_problem_number():
+    matcher = QuestionMatcher({1: ['1001'], 2: ['1003']})
+    assert matcher.match_fuzzy("1002", set()) is None
+
+def test_fuzzy_still_matches_typos_with_the_same_number():
+    matcher = QuestionMatcher(list_questions(4))
+    assert matcher.match_fuzzy("qustao2", set()) == 2
+    assert matcher.match_fuzzy("questao 02", {1}) == 2
+
+def test_fuzzy_converts_number_words():
+    matcher = QuestionMatcher({1: ['exercicio 1'], 2: ['exercicio 2']})
+    assert matcher.match_fuzzy("exercicio dois", set()) == 2
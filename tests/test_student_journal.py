@@ -0,0 +1,93 @@
+import json
+import os
+from core.models.download_manifest import (AttachmentRecord, STAGE_DOWNLOADED, STAGE_ORGANIZED, STAGE_RENAMED,
+                                           load_manifest_from_json)
+from core.models.student_journal import StudentJournal, drop_torn_tail, journal_path, replay_journal
+from core.models.student_registry import StudentRegistry, compact_students, load_registry_from_txt
+
+def write_lines(path, lines, tail=''):
+    with open(path, "w", encoding="utf-8") as file:
+        file.writelines(json.dumps(line) + "\n" for line in lines)
+        file.write(tail)
+
+def test_replay_applies_fields_and_comments_once(tmp_path, make_student):
+    path = os.path.join(tmp_path, "students.journal")
+    write_lines(path, [
+        {"op": "field", "login": "alu0001", "field": "formatacao", "value": 0},
+        {"op": "comment", "login": "alu0001", "text": "Erro de formatação de pasta."},
+        {"op": "field", "login": "alu9999", "field": "copia", "value": 1},
+    ])
+    students = StudentRegistry([make_student()])
+
+    replay_journal(students, path)
+    replay_journal(students, path)
+    student = students.get("alu0001")
+    assert student.formatacao == 0
+    assert student.comentario == "Erro de formatação de pasta."
+
+def test_replay_skips_a_torn_last_line(tmp_path, make_student):
+    path = os.path.join(tmp_path, "students.journal")
+    write_lines(path, [{"op": "field", "login": "alu0001", "field": "copia", "value": 1}], tail='{"op": "fie')
+    students = StudentRegistry([make_student()])
+
+    assert replay_journal(students, path) == 1
+    assert students.get("alu0001").copia == 1
+
+def test_drop_torn_tail_keeps_complete_lines(tmp_path):
+    path = os.path.join(tmp_path, "students.journal")
+    write_lines(path, [{"op": "comment", "login": "alu0001", "text": "a"}], tail='{"op": "comm')
+
+    drop_torn_tail(path)
+    with open(path, encoding="utf-8") as file:
+        assert file.read() == json.dumps({"op": "comment", "login": "alu0001", "text": "a"}) + "\n"
+
+def test_journal_reopened_after_a_torn_write_appends_on_a_new_line(tmp_path, make_student):
+    path = os.path.join(tmp_path, "students.journal")
+    write_lines(path, [], tail='{"op": "comm')
+
+    with StudentJournal(path) as journal:
+        journal.record_field("alu0001", "copia", 1)
+    students = StudentRegistry([make_student()])
+    assert replay_journal(students, path) == 1
+
+def test_snapshot_and_journal_recover_state_and_stages_after_a_crash(tmp_path, make_student):
+    students_path = os.path.join(tmp_path, "students_turmaA.json")
+    manifest_path = os.path.join(tmp_path, "manifest_turmaA.json")
+    manifest = load_manifest_from_json(manifest_path, "Turma A", "Lista 01")
+    student = make_student()
+    manifest.record_download(student.login, "user-1", [AttachmentRecord("file-1", "alu0001.zip", path="alu0001.zip")],
+                             str(tmp_path))
+    students = StudentRegistry([student])
+
+    # Execução que cai depois da organização: nem o arquivo de alunos nem o manifesto são regravados
+    journal = StudentJournal(journal_path(students_path))
+    compact_students(students, students_path, journal, manifest)
+    students.attach_journal(journal)
+    student.update_field("formatacao", 0)
+    student.add_comment("Erro de formatação de pasta.")
+    manifest.set_stage(students, STAGE_ORGANIZED, journal)
+    journal.close()
+
+    reloaded_manifest = load_manifest_from_json(manifest_path, "Turma A", "Lista 01")
+    assert reloaded_manifest.stage_of(student.login) == STAGE_DOWNLOADED
+    recovered = load_registry_from_txt(students_path, reloaded_manifest)
+    assert recovered.get(student.login) == student
+    assert reloaded_manifest.stage_of(student.login) == STAGE_ORGANIZED
+
+def test_compaction_saves_the_manifest_before_emptying_the_journal(tmp_path, make_student):
+    students_path = os.path.join(tmp_path, "students_turmaA.json")
+    manifest_path = os.path.join(tmp_path, "manifest_turmaA.json")
+    manifest = load_manifest_from_json(manifest_path, "Turma A", "Lista 01")
+    student = make_student()
+    manifest.record_download(student.login, "user-1", [], str(tmp_path))
+    students = StudentRegistry([student])
+    with StudentJournal(journal_path(students_path)) as journal:
+        compact_students(students, students_path, journal, manifest)
+        manifest.set_stage(students, STAGE_RENAMED, journal)
+
+    manifest = load_manifest_from_json(manifest_path, "Turma A", "Lista 01")
+    students = load_registry_from_txt(students_path, manifest)
+    compact_students(students, students_path, manifest=manifest)
+
+    assert not os.path.exists(journal_path(students_path))
+    assert load_manifest_from_json(manifest_path, "Turma A", "Lista 01").stage_of(student.login) == STAGE_RENAMED
@@ -0,0 +1,39 @@
+import hashlib
+import os
+import socket
+import pytest
+from infrastructure import submission_handler
+from infrastructure.blob_store import BlobStore
+
+CONTENT = b"PK\x05\x06" + b"\x00" * 18
+
+def fake_download(error=None):
+    def download_file(drive_service, file_id, fh, label, http=None):
+        fh.write(CONTENT[:4])
+        if error is not None:
+            raise error
+        fh.write(CONTENT[4:])
+        return 100
+    return download_file
+
+@pytest.mark.parametrize("error", [OSError("disco cheio"), socket.timeout("timed out")])
+def test_failed_download_leaves_no_temporary_blob(tmp_path, monkeypatch, error, make_student):
+    blob_store = BlobStore(str(tmp_path / ".blobs"))
+    monkeypatch.setattr(submission_handler, "download_file", fake_download(error))
+
+    with pytest.raises(type(error)):
+        submission_handler.handle_attachment("file-1", "alu0001.zip", str(tmp_path), make_student(), None,
+                                             blob_store=blob_store)
+    assert os.listdir(blob_store.tmp_dir) == []
+
+def test_committed_download_is_stored_and_linked(tmp_path, monkeypatch, make_student):
+    blob_store = BlobStore(str(tmp_path / ".blobs"))
+    monkeypatch.setattr(submission_handler, "download_file", fake_download())
+    md5 = hashlib.md5(CONTENT).hexdigest()
+
+    path = submission_handler.handle_attachment("file-1", "alu0001.zip", str(tmp_path), make_student(), None,
+                                                md5_checksum=md5, blob_store=blob_store)
+    assert os.listdir(blob_store.tmp_dir) == []
+    assert blob_store.has(md5)
+    with open(path, "rb") as file:
+        assert file.read() == CONTENT
@@ -0,0 +1,138 @@
+import atexit
+import contextvars
+import json
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from multiprocessing import util as multiprocessing_util
+
+# Pasta dos logs; a variável de ambiente LOG_FOLDER vale também nos processos de extração, que importam o módulo de novo
+LOG_FOLDER = os.environ.get("LOG_FOLDER", "output")
+LOG_FILES = {
+    "info": "output_log.jsonl",
+    "error": "error_log.jsonl",
+}
+LEVELS = {"DEBUG": 10, "INFO": 20, "ERROR": 40}
+# Nível mínimo gravado; LOG_LEVEL=DEBUG inclui o progresso de cada bloco baixado
+LOG_LEVEL = LEVELS.get(os.environ.get("LOG_LEVEL", "INFO").upper(), LEVELS["INFO"])
+# Máximo de registros escritos de uma vez pela thread de escrita
+BATCH_SIZE = 512
+
+# Etapa do pipeline e aluno do registro atual. Threads de executores começam com o contexto vazio, então os workers
+# abrem o próprio log_context.
+_stage = contextvars.ContextVar("log_stage", default=None)
+_login = contextvars.ContextVar("log_login", default=None)
+
+@contextmanager
+def log_context(stage=None, login=None):
+    tokens = []
+    if stage is not None:
+        tokens.append((_stage, _stage.set(stage)))
+    if login is not None:
+        tokens.append((_login, _login.set(login)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+class LogWriter:
+    # Fila sem bloqueio consumida por uma thread que grava os registros em lotes, cada lote numa única escrita por
+    # arquivo. Os arquivos ficam abertos em modo append, então processos diferentes podem escrever neles juntos.
+    def __init__(self):
+        self.queue = queue.SimpleQueue()
+        self.files = {}
+        self.thread = threading.Thread(target=self.run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def put(self, record):
+        self.queue.put(record)
+
+    def open_file(self, kind):
+        if kind not in self.files:
+            os.makedirs(LOG_FOLDER, exist_ok=True)
+            self.files[kind] = open(os.path.join(LOG_FOLDER, LOG_FILES[kind]), "ab", buffering=0)
+        return self.files[kind]
+
+    def run(self):
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = [record for record in batch if record is not None]
+            self.write(batch)
+        for file in self.files.values():
+            file.close()
+
+    def write(self, batch):
+        lines = {}
+        for record in batch:
+            kind = "error" if record["level"] == "ERROR" else "info"
+            lines.setdefault(kind, []).append(json.dumps(record, ensure_ascii=False))
+        for kind, kind_lines in lines.items():
+            try:
+                self.open_file(kind).write(("\n".join(kind_lines) + "\n").encode("utf-8"))
+            except Exception:
+                pass
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+# A thread de escrita é criada no primeiro registro de cada processo: um processo filho criado por fork herda a
+# variável, mas não a thread, então o pid é conferido
+def get_writer():
+    global _writer, _writer_pid
+    pid = os.getpid()
+    if _writer_pid != pid:
+        with _writer_lock:
+            if _writer_pid != pid:
+                _writer = LogWriter()
+                _writer_pid = pid
+                # Os workers de ProcessPoolExecutor saem sem passar pelo atexit, só pelos finalizadores do multiprocessing
+                multiprocessing_util.Finalize(None, close_writer, exitpriority=100)
+    return _writer
+
+def close_writer():
+    global _writer, _writer_pid
+    with _writer_lock:
+        writer = _writer if _writer_pid == os.getpid() else None
+        _writer = _writer_pid = None
+    if writer is not None:
+        writer.close()
+
+atexit.register(close_writer)
+
+# Redireciona os logs desse processo e dos processos criados depois dele (ex: o benchmark grava na própria pasta de
+# trabalho). O que já estava na fila é gravado na pasta anterior.
+def set_log_folder(folder):
+    global LOG_FOLDER
+    close_writer()
+    LOG_FOLDER = os.environ["LOG_FOLDER"] = folder
+
+def log_file_path(filename):
+    os.makedirs(LOG_FOLDER, exist_ok=True)
+    return os.path.join(LOG_FOLDER, filename)
+
+def write_log(level, message):
+    if LEVELS[level] < LOG_LEVEL:
+        return
+    get_writer().put({
+        "time": datetime.now().isoformat(timespec="milliseconds"),
+        "level": level,
+        "stage": _stage.get(),
+        "login": _login.get(),
+        "message": str(message).strip(),
+    })
@@ -0,0 +1,76 @@
+import cProfile
+import os
+import re
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from utils.utils import log_error, log_info
+
+PROFILES_FOLDER = os.path.join("output", "profiles")
+# Linhas de código que mais alocaram memória listadas por etapa
+TOP_ALLOCATORS = 25
+# Quadros guardados por alocação no tracemalloc
+TRACEMALLOC_FRAMES = 1
+
+_run_folder = None
+_sequence = 0
+_lock = threading.Lock()
+
+# Liga o --profile: cada profile_stage passa a gravar, em output/profiles/<run>_<data>/, o pstats do cProfile
+# e as linhas que mais alocaram memória (tracemalloc) durante a etapa
+def enable_profiling(run):
+    global _run_folder
+    _run_folder = os.path.join(PROFILES_FOLDER, f"{run}_{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+    os.makedirs(_run_folder, exist_ok=True)
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    log_info(f"Profiling ativado, resultados em {_run_folder}")
+
+def profiling_enabled():
+    return _run_folder is not None
+
+def next_stage_path(stage):
+    global _sequence
+    with _lock:
+        _sequence += 1
+        sequence = _sequence
+    return os.path.join(_run_folder, f"{sequence:02d}_{re.sub(r'[^A-Za-z0-9_.-]+', '_', stage)}")
+
+# O cProfile mede só a thread que executa a etapa e o tracemalloc conta as alocações de todas as threads, por isso
+# com --profile as turmas rodam uma de cada vez e os downloads, a extração e a verificação de cópias rodam na
+# própria thread da etapa (profiling_enabled() é conferido por quem cria os workers). Sem --profile não faz nada.
+@contextmanager
+def profile_stage(stage):
+    if _run_folder is None:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        save_stage_profile(stage, profiler, before, after, peak)
+
+def save_stage_profile(stage, profiler, before, after, peak):
+    try:
+        path = next_stage_path(stage)
+        profiler.dump_stats(f"{path}.pstats")
+
+        # Só as linhas cuja memória alocada cresceu durante a etapa, sem as do próprio tracemalloc
+        ignored = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+        stats = after.filter_traces(ignored).compare_to(before.filter_traces(ignored), 'lineno')
+        growth = sorted((stat for stat in stats if stat.size_diff > 0), key=lambda stat: stat.size_diff, reverse=True)
+
+        lines = [f"Etapa: {stage}", f"Pico de memória: {peak / (1024 * 1024):.1f} MB", ""]
+        lines.extend(str(stat) for stat in growth[:TOP_ALLOCATORS])
+        with open(f"{path}_memory.txt", "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        log_info(f"Profiling da etapa {stage} salvo em {path}.pstats")
+    except Exception as e:
+        log_error(f"Erro ao salvar profiling da etapa {stage}: {e}")
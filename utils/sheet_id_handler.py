@@ -3,11 +3,12 @@ import gspread
 from gspread.exceptions import WorksheetNotFound
 from utils.utils import log_error
 from infrastructure.auth_google import get_gspread_client
+from infrastructure.api_executor import call_with_retry
 
 def list_informations(sheet_id):
     try:
         client = get_gspread_client()
-        spreadsheet = client.open_by_key(sheet_id)
+        spreadsheet = call_with_retry("sheets", client.open_by_key, sheet_id)
 
         semester = spreadsheet.title.strip()
         
@@ -15,7 +16,7 @@ def list_informations(sheet_id):
             print(f"O título da planilha deve estar no formato 'YYYY.S' (ex: 2024.2). Encontrado: '{semester}'\n")
             return None, None
 
-        lists = [ws.title for ws in spreadsheet.worksheets()]
+        lists = [ws.title for ws in call_with_retry("sheets", spreadsheet.worksheets)]
         return semester, lists
 
     except WorksheetNotFound:
@@ -28,10 +29,10 @@ def list_informations(sheet_id):
 def list_questions(sheet_id, sheet_name):
     try:
         client = get_gspread_client()
-        spreadsheet = client.open_by_key(sheet_id)
+        spreadsheet = call_with_retry("sheets", client.open_by_key, sheet_id)
 
-        sheet = spreadsheet.worksheet(sheet_name)
-        rows = sheet.get_all_values()[1:]  # Ignora cabeçalho
+        sheet = call_with_retry("sheets", spreadsheet.worksheet, sheet_name)
+        rows = call_with_retry("sheets", sheet.get_all_values)[1:]  # Ignora cabeçalho
 
         if not rows:
             print(f"A planilha '{sheet_name}' não tem campos preenchidos.\n")
@@ -1,6 +1,6 @@
-import os
 import re
 from datetime import datetime
+from utils.log_writer import write_log
 
 def read_id_from_file(filename):
     try:
@@ -35,26 +35,20 @@ def calculate_delay(due_date_str, submission_date_str):
         log_error(f"Erro ao calcular atraso: {e}")
         return 0
 
-def get_due_date(classroom_service, classroom_id, coursework_id):
-    try:
-        coursework = classroom_service.courses().courseWork().get(
-            courseId=classroom_id, id=coursework_id).execute()
-        due_date = coursework.get('dueDate')
-        due_time = coursework.get('dueTime')
+def parse_due_date(coursework):
+    due_date = coursework.get('dueDate')
+    due_time = coursework.get('dueTime')
 
-        if due_date:
-            year = due_date['year']
-            month = due_date['month']
-            day = due_date['day']
-            hours = due_time.get('hours', 2) if due_time else 2
-            minutes = due_time.get('minutes', 59) if due_time else 59
-            seconds = due_time.get('seconds', 59) if due_time else 59
+    if due_date:
+        year = due_date['year']
+        month = due_date['month']
+        day = due_date['day']
+        hours = due_time.get('hours', 2) if due_time else 2
+        minutes = due_time.get('minutes', 59) if due_time else 59
+        seconds = due_time.get('seconds', 59) if due_time else 59
 
-            return f"{year}-{month:02d}-{day:02d}T{hours:02d}:{minutes:02d}:{seconds:02d}.000Z"
-        return None
-    except Exception as e:
-        log_error(f"Erro ao obter data de entrega: {e}")
-        return None
+        return f"{year}-{month:02d}-{day:02d}T{hours:02d}:{minutes:02d}:{seconds:02d}.000Z"
+    return None
 
 def get_submission_timestamp(submission, student_id):
     try:
@@ -67,22 +61,21 @@ def get_submission_timestamp(submission, student_id):
         log_error(f"Erro ao obter timestamp da submissão: {e}")
         return None
 
+# Os registros vão para a fila do utils/log_writer.py e são gravados em lote por uma thread, em JSON lines
 def log_error(message):
     try:
-        os.makedirs("output", exist_ok=True)
-        log_path = os.path.join("output", "error_log.txt")
-        
-        with open(log_path, "a", encoding="utf-8") as file:
-            file.write(f"{message}\n")
+        write_log("ERROR", message)
     except Exception:
         pass
 
 def log_info(message):
     try:
-        os.makedirs("output", exist_ok=True)
-        log_path = os.path.join("output", "output_log.txt")
+        write_log("INFO", message)
+    except Exception:
+        pass
 
-        with open(log_path, "a", encoding="utf-8") as file:
-            file.write(f"{message}\n")
+def log_debug(message):
+    try:
+        write_log("DEBUG", message)
     except Exception:
-        log_error(f"Erro ao escrever log de info: {message}")
+        pass